@@ -0,0 +1,119 @@
+import argparse
+import os
+import random
+import sys
+import timeit
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from extractor.core.data.generator.coords import bounding_boxes, image_polygons, labels_to_points, transform_points
+
+
+def parse_args():
+    """
+    Parse args passed on while calling the script.
+    """
+    args_parser = argparse.ArgumentParser(description='Compare per point and vectorized coordinate transforms.')
+
+    args_parser.add_argument('-n', '--images',
+                             default=1000,
+                             dest='images',
+                             type=int,
+                             help='Number of synthetic images')
+
+    args_parser.add_argument('-l', '--labels',
+                             default=4,
+                             dest='labels',
+                             type=int,
+                             help='Number of labels per image')
+
+    args_parser.add_argument('-p', '--points',
+                             default=4,
+                             dest='points',
+                             type=int,
+                             help='Number of points per polygon')
+
+    args_parser.add_argument('-r', '--repeat',
+                             default=5,
+                             dest='repeat',
+                             type=int,
+                             help='Number of timing repetitions, best one is reported')
+
+    return args_parser.parse_args()
+
+
+def generate_labels(images, labels, points):
+    """ Generate labelbox style label dicts along with pad and scale factors for each image. """
+    random.seed(0)
+    dataset = []
+    for _ in range(images):
+        json_labels = {
+            'label_{}'.format(index): [[{'x': random.uniform(0, 1280), 'y': random.uniform(0, 720)}
+                                        for _ in range(points)]]
+            for index in range(labels)
+        }
+        dataset.append((json_labels, 1280 / 300., 720 / 262., 19, 262))
+
+    return dataset
+
+
+def per_point(dataset):
+    """ Reference implementation: one Python int conversion per point, as PascalVOCGenerator used to do. """
+    for json_labels, x_factor, y_factor, pad_top, scaled_height in dataset:
+        for label, polygons in json_labels.items():
+            xy_coords = []
+            for coords in polygons[0]:
+                new_x = int(coords['x'] / x_factor)
+                new_y = pad_top + scaled_height - int(coords['y'] / y_factor)
+                xy_coords.extend([new_x, new_y])
+
+
+def per_image(dataset):
+    """ What PascalVOCGenerator runs: scalar for images up to SCALAR_MAX_POINTS points, vectorized above. """
+    for json_labels, x_factor, y_factor, pad_top, scaled_height in dataset:
+        image_polygons(json_labels, x_factor, y_factor, pad_top, scaled_height)
+
+
+def per_image_scalar(dataset):
+    """ Polygons and bounding boxes converted point by point, whatever the image size. """
+    for json_labels, x_factor, y_factor, pad_top, scaled_height in dataset:
+        image_polygons(json_labels, x_factor, y_factor, pad_top, scaled_height, scalar_max_points=float('inf'))
+
+
+def per_image_vectorized(dataset):
+    """ Vectorized transform and bounding boxes, one call per image whatever its size. """
+    for json_labels, x_factor, y_factor, pad_top, scaled_height in dataset:
+        image_polygons(json_labels, x_factor, y_factor, pad_top, scaled_height, scalar_max_points=-1)
+
+
+def per_batch(dataset):
+    """ Vectorized transform and bounding boxes, one call for the whole batch. """
+    all_labels = {}
+    counts = []
+    for index, (json_labels, x_factor, y_factor, pad_top, scaled_height) in enumerate(dataset):
+        for label, polygons in json_labels.items():
+            all_labels['{}/{}'.format(index, label)] = polygons
+        counts.append(sum(len(polygons[0]) for polygons in json_labels.values()))
+
+    names, points, offsets = labels_to_points(all_labels)
+    factors = np.repeat(np.array([item[1:] for item in dataset], dtype=np.float64), counts, axis=0)
+    points = transform_points(points, factors[:, 0], factors[:, 1], factors[:, 2], factors[:, 3])
+    bounding_boxes(points, offsets)
+
+
+def main():
+    parsed_args = parse_args()
+    dataset = generate_labels(parsed_args.images, parsed_args.labels, parsed_args.points)
+
+    functions = (('per point', per_point), ('per image', per_image), ('scalar', per_image_scalar),
+                 ('vectorized', per_image_vectorized), ('per batch', per_batch))
+    for name, function in functions:
+        best = min(timeit.repeat(lambda: function(dataset), number=1, repeat=parsed_args.repeat))
+        print('{:<10} {:>9.2f} ms  {:>8.2f} us/image'.format(
+            name, best * 1000, best * 1e6 / parsed_args.images))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,213 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+from datetime import datetime
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.synthetic_export import generate_export
+from extractor.core.parser.json_stream import iter_json_entries
+from extractor.engine import ExtractionEngine
+from extractor.extractor import Extractor
+from utils.logger import create_logger, setup_logging
+from utils.metrics import RunMetrics
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT_DIR, 'benchmarks', 'results')
+REPORTED_STAGES = ('parse', 'download', 'decode', 'resize', 'encode', 'annotate', 'label_map', 'copy_to_detection')
+
+
+def parse_args():
+    """
+    Parse args passed on while calling the script.
+    """
+    args_parser = argparse.ArgumentParser(description='Time a full extraction of synthetic labelbox exports.')
+
+    args_parser.add_argument('-n', '--images',
+                             default=[100, 10000, 100000],
+                             dest='images',
+                             type=int,
+                             nargs='+',
+                             help='Export sizes to benchmark')
+
+    args_parser.add_argument('-s', '--source',
+                             default='http',
+                             dest='source',
+                             choices=('http', 'file'),
+                             help='Serve images from a local http server, or read them in place from file:// urls')
+
+    args_parser.add_argument('-dw', '--download_workers',
+                             default=8,
+                             dest='download_workers',
+                             type=int,
+                             help='Number of images downloaded concurrently')
+
+    args_parser.add_argument('-w', '--workers',
+                             default=1,
+                             dest='workers',
+                             type=int,
+                             help='Number of processes used to resize and annotate images')
+
+    args_parser.add_argument('-a', '--async',
+                             default=False,
+                             dest='use_async',
+                             action='store_true',
+                             help='Run the asyncio extraction engine')
+
+    args_parser.add_argument('-o', '--output_file',
+                             default=None,
+                             dest='output_file',
+                             type=str,
+                             help='Result file, defaults to benchmarks/results/<timestamp>.json')
+
+    args_parser.add_argument('-c', '--compare',
+                             default=None,
+                             dest='compare',
+                             type=str,
+                             help='Previous result file to compare against')
+
+    return args_parser.parse_args()
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_directory(directory):
+    """ Serve directory over http on a free local port from a background thread. """
+    server = ThreadingHTTPServer(('127.0.0.1', 0), partial(QuietHandler, directory=directory))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def environment():
+    try:
+        commit = subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT_DIR, stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    return {
+        'commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+    }
+
+
+def run_extraction(export_file, work_dir, parsed_args):
+    """ Run one extraction over export_file and return its report. """
+    metrics = RunMetrics()
+    with metrics.stage('parse'):
+        with open(export_file, 'r') as json_file:
+            entries = sum(1 for _ in iter_json_entries(json_file))
+    metrics.increment('entries', entries)
+
+    config = {
+        'json_file': export_file,
+        'output_dir': os.path.join(work_dir, 'output'),
+        'detection_dir': os.path.join(work_dir, 'detection'),
+        'required_img_width': 300,
+        'required_img_height': 300,
+        'download_workers': parsed_args.download_workers,
+        'workers': parsed_args.workers,
+        'metrics': metrics,
+        'report_file': os.path.join(work_dir, 'run_report.json'),
+    }
+
+    if parsed_args.use_async:
+        asyncio.run(ExtractionEngine(logger=create_logger, **config).run())
+    else:
+        Extractor(logger=create_logger, **config)
+
+    return metrics.report()
+
+
+def benchmark(images, parsed_args):
+    """ Time a cold extraction of a synthetic export, then an incremental rerun over the same output. """
+    work_dir = tempfile.mkdtemp(prefix='bench_extraction_')
+    server = None
+    try:
+        export_dir = os.path.join(work_dir, 'export')
+        if parsed_args.source == 'http':
+            server = serve_directory(os.path.join(export_dir, 'images'))
+            base_url = 'http://127.0.0.1:{}/'.format(server.server_address[1])
+        else:
+            base_url = 'file://' + os.path.join(export_dir, 'images')
+        export_file = generate_export(export_dir, images, base_url)
+
+        for folder in ('annotations/xmls', 'images'):
+            os.makedirs(os.path.join(work_dir, 'detection', folder))
+
+        return [
+            {'images': images, 'source': parsed_args.source, 'pass': run_pass,
+             'report': run_extraction(export_file, work_dir, parsed_args)}
+            for run_pass in ('cold', 'incremental')
+        ]
+    finally:
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+        shutil.rmtree(work_dir)
+
+
+def print_run(run, previous=None):
+    report = run['report']
+    line = '{:>7} {:<12} {:>9.2f} s {:>10.1f} img/s'.format(
+        run['images'], run['pass'], report['duration_s'], report['images_per_s'] or 0)
+    if previous is not None:
+        line += '  ({:+.1%} vs previous)'.format(report['duration_s'] / previous['report']['duration_s'] - 1)
+    print(line)
+
+    for name in REPORTED_STAGES:
+        stage = report['stages'].get(name)
+        if stage is None:
+            continue
+        line = '          {:<18} {:>9.3f} s  p50 {:>8.3f} ms  p95 {:>8.3f} ms'.format(
+            name, stage['total_s'], stage['p50_ms'], stage['p95_ms'])
+        previous_stage = previous['report']['stages'].get(name) if previous is not None else None
+        if previous_stage and previous_stage['total_s']:
+            line += '  ({:+.1%})'.format(stage['total_s'] / previous_stage['total_s'] - 1)
+        print(line)
+
+
+def main():
+    parsed_args = parse_args()
+    setup_logging(logging.ERROR)
+
+    previous_runs = {}
+    if parsed_args.compare:
+        with open(parsed_args.compare, 'r') as previous_file:
+            for run in json.load(previous_file)['runs']:
+                previous_runs[(run['images'], run['source'], run['pass'])] = run
+
+    results = {'environment': environment(), 'args': vars(parsed_args), 'runs': []}
+    for images in parsed_args.images:
+        for run in benchmark(images, parsed_args):
+            results['runs'].append(run)
+            print_run(run, previous_runs.get((run['images'], run['source'], run['pass'])))
+
+    output_file = parsed_args.output_file or os.path.join(
+        RESULTS_DIR, '{:%Y%m%d-%H%M%S}.json'.format(datetime.now()))
+    if not os.path.exists(os.path.dirname(os.path.abspath(output_file))):
+        os.makedirs(os.path.dirname(os.path.abspath(output_file)))
+    with open(output_file, 'w') as result_file:
+        json.dump(results, result_file, indent=2, sort_keys=True)
+    print('Results written to {}'.format(output_file))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+import argparse
+import os
+import sys
+import timeit
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from extractor.core.data.resize_plan import ResizePlan, resize_plan
+
+
+def parse_args():
+    """
+    Parse args passed on while calling the script.
+    """
+    args_parser = argparse.ArgumentParser(description='Compare per image and planned letterbox resizing.')
+
+    args_parser.add_argument('-n', '--images',
+                             default=200,
+                             dest='images',
+                             type=int,
+                             help='Number of synthetic images per source resolution')
+
+    args_parser.add_argument('-iw', '--required_img_width',
+                             default=300,
+                             dest='required_img_width',
+                             type=int,
+                             help='Target image width')
+
+    args_parser.add_argument('-ih', '--required_img_height',
+                             default=300,
+                             dest='required_img_height',
+                             type=int,
+                             help='Target image height')
+
+    args_parser.add_argument('-r', '--repeat',
+                             default=3,
+                             dest='repeat',
+                             type=int,
+                             help='Number of timing repetitions, best one is reported')
+
+    return args_parser.parse_args()
+
+
+def unplanned_resize(image, target_width, target_height):
+    """ Compute the plan for every image and pad with a freshly allocated border, as done before plans. """
+    plan = ResizePlan(image.shape[1], image.shape[0], target_width, target_height)
+    scaled = cv2.resize(image, plan.scaled_size, interpolation=plan.interpolation)
+    return cv2.copyMakeBorder(scaled, plan.pad_top, plan.pad_bot, plan.pad_left, plan.pad_right,
+                              borderType=cv2.BORDER_CONSTANT, value=0)
+
+
+def main():
+    parsed_args = parse_args()
+    width, height = parsed_args.required_img_width, parsed_args.required_img_height
+    rng = np.random.RandomState(0)
+    groups = [
+        [rng.randint(0, 255, (source_height, source_width, 3), dtype=np.uint8)] * parsed_args.images
+        for source_width, source_height in ((640, 480), (1280, 720), (480, 640))
+    ]
+    images = [image for group in groups for image in group]
+
+    candidates = [
+        ('unplanned', lambda: [unplanned_resize(image, width, height) for image in images]),
+        ('planned', lambda: [resize_plan(image.shape[1], image.shape[0], width, height).resize(image)
+                             for image in images]),
+        ('batched', lambda: [resize_plan(group[0].shape[1], group[0].shape[0], width, height).resize_batch(group)
+                             for group in groups]),
+    ]
+
+    for name, function in candidates:
+        best = min(timeit.repeat(function, number=1, repeat=parsed_args.repeat))
+        print('{:<10} {:>9.2f} ms  {:>10.0f} images/s'.format(name, best * 1000, len(images) / best))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# modules which must only load once an image is actually processed or fetched
+HEAVY_MODULES = ('cv2', 'numpy', 'requests', 'urllib3', 'PIL', 'Augmentor', 'shapely', 'crc32c')
+
+SCENARIOS = (
+    ('help', [sys.executable, 'main.py', '--help']),
+    ('import_extractor', [sys.executable, '-c', 'import extractor.extractor']),
+    ('import_engine', [sys.executable, '-c', 'import extractor.engine']),
+)
+
+LOADED_MODULES_SCRIPT = (
+    'import sys, json; import extractor.extractor, extractor.engine; '
+    'print(json.dumps(sorted(name for name in {} if name in sys.modules)))'.format(list(HEAVY_MODULES)))
+
+
+def parse_args():
+    """
+    Parse args passed on while calling the script.
+    """
+    args_parser = argparse.ArgumentParser(description='Measure interpreter startup and pipeline import time.')
+
+    args_parser.add_argument('-r', '--repeat',
+                             default=10,
+                             dest='repeat',
+                             type=int,
+                             help='Number of runs per scenario, best one is reported')
+
+    args_parser.add_argument('-m', '--max_ms',
+                             default=None,
+                             dest='max_ms',
+                             type=float,
+                             help='Fail when a scenario is slower than this many milliseconds over bare python')
+
+    args_parser.add_argument('-o', '--output',
+                             default=None,
+                             dest='output',
+                             type=str,
+                             help='Write results as json to this file')
+
+    return args_parser.parse_args()
+
+
+def best_time(command, repeat):
+    """ Best wall time of command over repeat runs, in seconds. """
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(command, cwd=ROOT_DIR, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def loaded_heavy_modules():
+    """ Heavy modules loaded by importing the pipeline, which should be none. """
+    output = subprocess.run([sys.executable, '-c', LOADED_MODULES_SCRIPT], cwd=ROOT_DIR, check=True,
+                            stdout=subprocess.PIPE, universal_newlines=True).stdout
+    return json.loads(output)
+
+
+def main():
+    parsed_args = parse_args()
+    baseline = best_time([sys.executable, '-c', 'pass'], parsed_args.repeat)
+    print('{:<18} {:>9.1f} ms'.format('python', baseline * 1000))
+
+    results = {'python_ms': baseline * 1000, 'scenarios': {}}
+    failed = False
+    for name, command in SCENARIOS:
+        overhead_ms = (best_time(command, parsed_args.repeat) - baseline) * 1000
+        results['scenarios'][name] = overhead_ms
+        print('{:<18} {:>+9.1f} ms'.format(name, overhead_ms))
+        if parsed_args.max_ms is not None and overhead_ms > parsed_args.max_ms:
+            failed = True
+
+    heavy_modules = loaded_heavy_modules()
+    results['heavy_modules'] = heavy_modules
+    print('heavy modules loaded at import: {}'.format(', '.join(heavy_modules) or 'none'))
+
+    if parsed_args.output:
+        with open(parsed_args.output, 'w') as output_file:
+            json.dump(results, output_file, indent=2)
+
+    if failed or heavy_modules:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
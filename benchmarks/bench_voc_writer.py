@@ -0,0 +1,85 @@
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from extractor.core.data.generator.voc_writer import PascalVOCWriter
+
+
+def parse_args():
+    """
+    Parse args passed on while calling the script.
+    """
+    args_parser = argparse.ArgumentParser(description='Compare Pascal VOC writers throughput.')
+
+    args_parser.add_argument('-n', '--annotations',
+                             default=2000,
+                             dest='annotations',
+                             type=int,
+                             help='Number of annotation files written per run')
+
+    args_parser.add_argument('-l', '--labels',
+                             default=4,
+                             dest='labels',
+                             type=int,
+                             help='Number of objects per annotation')
+
+    args_parser.add_argument('-r', '--repeat',
+                             default=3,
+                             dest='repeat',
+                             type=int,
+                             help='Number of timing repetitions, best one is reported')
+
+    return args_parser.parse_args()
+
+
+def generate_objects(annotations, labels):
+    """ Generate (name, xy_coords) objects for each annotation. """
+    random.seed(0)
+    return [
+        [('label_{}'.format(index), [random.randint(0, 300) for _ in range(8)]) for index in range(labels)]
+        for _ in range(annotations)
+    ]
+
+
+def write_annotations(writer_class, dataset, output_dir):
+    for index, objects in enumerate(dataset):
+        writer = writer_class(path=os.path.join(output_dir, '{}.jpg'.format(index)),
+                              width=300, height=300, database='benchmark')
+        for name, xy_coords in objects:
+            writer.addObject(name=name, xy_coords=xy_coords)
+
+        writer.save(os.path.join(output_dir, '{}.xml'.format(index)))
+
+
+def main():
+    parsed_args = parse_args()
+    dataset = generate_objects(parsed_args.annotations, parsed_args.labels)
+    output_dir = tempfile.mkdtemp()
+
+    writers = [
+        ('native', lambda: write_annotations(PascalVOCWriter, dataset, output_dir)),
+    ]
+
+    try:
+        from pascal_voc_writer import Writer as PascalWriter
+        writers.insert(0, ('jinja', lambda: write_annotations(PascalWriter, dataset, output_dir)))
+    except ImportError:
+        print('pascal_voc_writer is not installed, skipping the jinja writer.')
+
+    try:
+        for name, function in writers:
+            best = min(timeit.repeat(function, number=1, repeat=parsed_args.repeat))
+            print('{:<12} {:>9.2f} ms  {:>10.0f} files/s'.format(
+                name, best * 1000, parsed_args.annotations / best))
+    finally:
+        shutil.rmtree(output_dir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+import argparse
+import json
+import os
+import random
+
+import cv2
+import numpy as np
+
+# (width, height) of the distinct source images, every entry links to one of them
+SOURCE_SIZES = ((640, 480), (1280, 720), (1920, 1080), (800, 600))
+LABEL_NAMES = ('Buoy', 'Dice', 'Gate', 'Path', 'Torpedo')
+
+
+def parse_args():
+    """
+    Parse args passed on while calling the script.
+    """
+    args_parser = argparse.ArgumentParser(description='Generate a synthetic labelbox export and its images.')
+
+    args_parser.add_argument('-n', '--images',
+                             default=100,
+                             dest='images',
+                             type=int,
+                             help='Number of entries in the export')
+
+    args_parser.add_argument('-o', '--output_dir',
+                             required=True,
+                             dest='output_dir',
+                             type=str,
+                             help='Directory receiving export.json and the images folder')
+
+    args_parser.add_argument('-u', '--base_url',
+                             default='http://127.0.0.1:8765/',
+                             dest='base_url',
+                             type=str,
+                             help='Url prefix of the images folder, http:// or file://')
+
+    args_parser.add_argument('-s', '--seed',
+                             default=0,
+                             dest='seed',
+                             type=int,
+                             help='Random seed, the same seed always produces the same export')
+
+    return args_parser.parse_args()
+
+
+def generate_source_images(images_dir, seed=0):
+    """ Write one noisy jpg per source size and return their paths. """
+    rng = np.random.RandomState(seed)
+    if not os.path.exists(images_dir):
+        os.makedirs(images_dir)
+
+    source_files = []
+    for width, height in SOURCE_SIZES:
+        # smooth gradient plus noise, compresses like a real underwater frame
+        gradient = np.linspace(0, 255, width, dtype=np.float32)[np.newaxis, :, np.newaxis]
+        image = np.clip(gradient + rng.normal(0, 24, (height, width, 3)), 0, 255).astype(np.uint8)
+        source_file = os.path.join(images_dir, 'source_{}x{}.jpg'.format(width, height))
+        cv2.imwrite(source_file, image)
+        source_files.append((source_file, width, height))
+
+    return source_files
+
+
+def generate_label(rng, width, height, labels):
+    """ Labelbox label with up to labels polygons of 4 point dicts inside a width x height image. """
+    json_labels = {}
+    for _ in range(rng.randint(1, labels)):
+        xmin, xmax = sorted(rng.uniform(0, width) for _ in range(2))
+        ymin, ymax = sorted(rng.uniform(0, height) for _ in range(2))
+        polygon = [{'x': int(x), 'y': int(y)} for x, y in ((xmin, ymin), (xmin, ymax), (xmax, ymax), (xmax, ymin))]
+        json_labels.setdefault(rng.choice(LABEL_NAMES), []).append(polygon)
+    return json_labels
+
+
+def generate_export(output_dir, images, base_url, seed=0, skip_ratio=0.05, labels=4):
+    """ Write a synthetic export of images entries and return its path.
+
+    Entries follow the schema LabeledImagePascalVOC consumes, a skip_ratio share
+    of them is labeled 'Skip'. Each entry gets its own image file name, linked to
+    one of a few distinct source images in output_dir/images.
+    """
+    rng = random.Random(seed)
+    images_dir = os.path.join(output_dir, 'images')
+    source_files = generate_source_images(images_dir, seed)
+    base_url = base_url if base_url.endswith('/') else base_url + '/'
+
+    entries = []
+    for index in range(images):
+        source_file, width, height = source_files[index % len(source_files)]
+        file_name = 'img_{:06d}.jpg'.format(index)
+        image_file = os.path.join(images_dir, file_name)
+        if not os.path.lexists(image_file):
+            os.symlink(os.path.basename(source_file), image_file)
+
+        entries.append({
+            'ID': 'synthetic{:06d}'.format(index),
+            'Labeled Data': base_url + file_name,
+            'Created By': 'benchmark@deep-extraction',
+            'Project Name': 'synthetic',
+            'Seconds to Label': round(rng.uniform(1, 30), 1),
+            'Label': 'Skip' if rng.random() < skip_ratio else generate_label(rng, width, height, labels),
+        })
+
+    export_file = os.path.join(output_dir, 'export.json')
+    with open(export_file, 'w') as json_file:
+        json.dump(entries, json_file)
+
+    return export_file
+
+
+def main():
+    parsed_args = parse_args()
+    export_file = generate_export(
+        parsed_args.output_dir, parsed_args.images, parsed_args.base_url, seed=parsed_args.seed)
+    print('Wrote {} entries to {}'.format(parsed_args.images, export_file))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+import hashlib
+from collections import namedtuple
+
+# numpy is imported by the kernels, the options below are read when parsing arguments
+OPERATIONS = ('hflip', 'vflip', 'brightness', 'underwater')
+DEFAULT_OPERATIONS = ('hflip', 'brightness', 'underwater')
+
+# brightness gain range, applied to every channel
+BRIGHTNESS_RANGE = (0.6, 1.4)
+# BGR gains at full depth: red fades first under water, blue and green carry further
+UNDERWATER_GAINS = (1.15, 1.1, 0.5)
+
+AugmentationParams = namedtuple('AugmentationParams', ['flip_x', 'flip_y', 'gains'])
+
+
+def variant_seed(seed, labelbox_id):
+    """ Seed of one image's variants, the same in every process and run. """
+    digest = hashlib.sha1('{}:{}'.format(seed, labelbox_id).encode('utf-8')).digest()
+    return int.from_bytes(digest[:4], 'little')
+
+
+def draw_params(count, operations, seed):
+    """ Random flips and per channel gains of count variants, as arrays with one row per variant. """
+    import numpy as np
+
+    for operation in operations:
+        if operation not in OPERATIONS:
+            raise ValueError('Unknown augmentation {}, expected one of {}'.format(operation, OPERATIONS))
+
+    random_state = np.random.RandomState(seed)
+    flip_x = np.zeros(count, dtype=bool)
+    flip_y = np.zeros(count, dtype=bool)
+    gains = np.ones((count, 3), dtype=np.float32)
+
+    if 'hflip' in operations:
+        flip_x = random_state.random_sample(count) < 0.5
+    if 'vflip' in operations:
+        flip_y = random_state.random_sample(count) < 0.5
+    if 'brightness' in operations:
+        gains *= random_state.uniform(*BRIGHTNESS_RANGE, size=(count, 1)).astype(np.float32)
+    if 'underwater' in operations:
+        depth = random_state.random_sample((count, 1)).astype(np.float32)
+        gains *= 1 + depth * (np.array(UNDERWATER_GAINS, dtype=np.float32) - 1)
+
+    return AugmentationParams(flip_x, flip_y, gains)
+
+
+def augment_batch(image, params):
+    """ Every variant of a BGR image as one (count, height, width, 3) array.
+
+    Flips are strided copies of the whole batch, gains go through one lookup
+    table per variant and channel applied to the batch in a single gather.
+    """
+    import numpy as np
+
+    count = len(params.gains)
+    batch = np.empty((count,) + image.shape, dtype=np.uint8)
+    batch[:] = image
+    batch[params.flip_x] = batch[params.flip_x, :, ::-1]
+    batch[params.flip_y] = batch[params.flip_y, ::-1]
+
+    if not np.all(params.gains == 1):
+        lookup = np.clip(np.arange(256, dtype=np.float32) * params.gains[:, :, None] + 0.5, 0, 255).astype(np.uint8)
+        offsets = (np.arange(count)[:, None] * 3 + np.arange(3)) * 256
+        batch = lookup.ravel().take(batch + offsets[:, None, None, :].astype(np.int32))
+
+    return batch
+
+
+def flip_points(points, width, height, flip_x, flip_y):
+    """ Points of a flipped image, pixel x mapping to width - 1 - x like the flipped array does. """
+    if flip_x:
+        points[:, 0] = width - 1 - points[:, 0]
+    if flip_y:
+        points[:, 1] = height - 1 - points[:, 1]
+    return points
@@ -0,0 +1,131 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.concurrency import imap_bounded
+from utils.metrics import RunMetrics
+
+
+class ImageDownloader:
+    """ Concurrent image fetcher sharing pooled keep-alive connections between workers. """
+
+    RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+    def __init__(self, logger, workers=8, retries=3, backoff_factor=0.5, timeout=30, session=None, metrics=None,
+                 cache=None, revalidate=False):
+        self._logger = logger(__name__)
+        self._metrics = metrics if metrics is not None else RunMetrics()
+        self._cache = cache
+        self._revalidate = revalidate
+        self._workers = max(1, workers)
+        self._retries = retries
+        self._backoff_factor = backoff_factor
+        self._timeout = timeout
+        self._session_instance = session
+        self._session_lock = threading.Lock()
+
+    def __str__(self):
+        return 'An image downloader running {} concurrent fetches'.format(self._workers)
+
+    @property
+    def _session(self):
+        """ Session created on first network fetch, runs served from disk never import requests. """
+        if self._session_instance is None:
+            with self._session_lock:
+                if self._session_instance is None:
+                    self._session_instance = self._create_session()
+        return self._session_instance
+
+    def _create_session(self):
+        """ Create a session whose connection pool is large enough for every worker. """
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+
+        retry = Retry(
+            total=self._retries,
+            backoff_factor=self._backoff_factor,
+            status_forcelist=self.RETRY_STATUS_CODES)
+        adapter = HTTPAdapter(
+            pool_connections=self._workers,
+            pool_maxsize=self._workers,
+            max_retries=retry)
+
+        session = requests.Session()
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+
+    def fetch(self, url):
+        """ Fetch raw image bytes from provided link (Cloud link), through the image cache when set.
+
+        Cached images are served without touching the network, unless revalidate
+        is set, in which case a conditional request checks them against their
+        ETag or Last-Modified date first.
+        """
+        record = self._cache.lookup(url) if self._cache is not None else None
+        if record is not None and not self._revalidate:
+            content = self._cache.read(record)
+            if content is not None:
+                self._metrics.increment('image_cache_hits')
+                return content
+            record = None
+
+        import requests
+
+        headers = {}
+        if record is not None:
+            if record['etag']:
+                headers['If-None-Match'] = record['etag']
+            if record['last_modified']:
+                headers['If-Modified-Since'] = record['last_modified']
+
+        try:
+            with self._metrics.stage('download') as stage:
+                response = self._session.get(url, timeout=self._timeout, headers=headers)
+                response.raise_for_status()
+                stage.size = len(response.content)
+
+            if response.status_code == 304:
+                content = self._cache.read(record)
+                if content is not None:
+                    self._metrics.increment('image_cache_hits')
+                    return content
+                # evicted since the lookup
+                with self._metrics.stage('download') as stage:
+                    response = self._session.get(url, timeout=self._timeout)
+                    response.raise_for_status()
+                    stage.size = len(response.content)
+
+            if self._cache is not None:
+                self._metrics.increment('image_cache_misses')
+                self._cache.store(url, response.content, etag=response.headers.get('ETag'),
+                                  last_modified=response.headers.get('Last-Modified'))
+            return response.content
+
+        except requests.exceptions.MissingSchema:
+            self._logger.exception(
+                '"source_image_url" attribute must be a URL.')
+        except requests.exceptions.RequestException:
+            self._logger.exception('Failed to fetch image from %s', url)
+        self._metrics.increment('download_failures')
+
+    def _fetch_job(self, job):
+        entry, url = job
+        if url is None:
+            return entry, None, True
+
+        content = self.fetch(url)
+        return entry, content, content is not None
+
+    def download(self, jobs):
+        """ Fetch (entry, url) jobs concurrently and yield (entry, content) in input order.
+
+        A job whose url is None is passed through with None content, which lets callers
+        route already downloaded images through the same stream.
+        """
+        with ThreadPoolExecutor(max_workers=self._workers) as executor:
+            results = imap_bounded(executor, self._fetch_job, jobs, window=self._workers * 2)
+
+            for entry, content, success in results:
+                if success:
+                    yield entry, content
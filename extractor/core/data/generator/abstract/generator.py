@@ -17,7 +17,7 @@ class AbstractGenerator:
         pass
 
     @abstractmethod
-    def _debug_bounding_box(self, xy_coords):
+    def _debug_bounding_box(self, bounding_boxes):
         pass
 
     @abstractmethod
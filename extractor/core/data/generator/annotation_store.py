@@ -0,0 +1,116 @@
+import json
+import os
+from array import array
+
+import numpy as np
+
+STORE_DIR_NAME = 'columnar'
+BOX_COLUMNS = ('xmin', 'ymin', 'xmax', 'ymax')
+IMAGE_COLUMNS = ('x_factor', 'y_factor', 'pad_top', 'pad_left')
+
+
+class AnnotationStoreWriter:
+    """ Write every bounding box of the dataset as one columnar store of .npy arrays.
+
+    One row per box:
+        image_index              -- row of the box's image in the per image arrays.
+        label_id                 -- id of the box's label in label_map.pbtxt.
+        xmin, ymin, xmax, ymax   -- box in resized image pixels, as in the Pascal VOC files.
+
+    One row per image, in trainval.txt order:
+        file_name, x_factor, y_factor, pad_top, pad_left
+
+    Rows are appended to compact typed arrays as images complete; the .npy
+    files are written once the dataset is done, each through a temporary file,
+    and load with np.load(mmap_mode='r') without parsing a single xml.
+    """
+
+    def __init__(self, store_dir):
+        self._store_dir = store_dir
+        self._file_names = []
+        self._labels = {}
+        self._image_index = array('i')
+        self._label_index = array('i')
+        self._boxes = {column: array('i') for column in BOX_COLUMNS}
+        self._factors = {column: array('d') for column in IMAGE_COLUMNS[:2]}
+        self._pads = {column: array('i') for column in IMAGE_COLUMNS[2:]}
+
+    def __str__(self):
+        return 'A columnar annotation store at {}'.format(self._store_dir)
+
+    def add(self, summary):
+        """ Append the boxes and resize factors of one image summary. """
+        self.add_image(summary.file_name, summary.boxes, summary.x_factor, summary.y_factor,
+                       summary.pad_top, summary.pad_left)
+
+    def add_image(self, file_name, boxes, x_factor, y_factor, pad_top, pad_left):
+        image_index = len(self._file_names)
+        self._file_names.append(file_name)
+        self._factors['x_factor'].append(x_factor)
+        self._factors['y_factor'].append(y_factor)
+        self._pads['pad_top'].append(pad_top)
+        self._pads['pad_left'].append(pad_left)
+
+        for label, xmin, ymin, xmax, ymax in boxes:
+            self._image_index.append(image_index)
+            self._label_index.append(self._labels.setdefault(label, len(self._labels)))
+            self._boxes['xmin'].append(xmin)
+            self._boxes['ymin'].append(ymin)
+            self._boxes['xmax'].append(xmax)
+            self._boxes['ymax'].append(ymax)
+
+    def write(self, label_names):
+        """ Write the store, label ids following label_names like label_map.pbtxt does (first id is 1). """
+        os.makedirs(self._store_dir, exist_ok=True)
+
+        # first seen order to label map ids, in one take over every box
+        label_ids = np.zeros(len(self._labels), dtype=np.int32)
+        for label, index in self._labels.items():
+            label_ids[index] = label_names.index(label) + 1
+
+        columns = {
+            'image_index': np.frombuffer(self._image_index, dtype=np.int32),
+            'label_id': label_ids[np.frombuffer(self._label_index, dtype=np.int32)],
+            'file_name': np.array(self._file_names, dtype=np.str_),
+        }
+        for column, values in self._boxes.items():
+            columns[column] = np.frombuffer(values, dtype=np.int32)
+        for column, values in self._factors.items():
+            columns[column] = np.frombuffer(values, dtype=np.float64)
+        for column, values in self._pads.items():
+            columns[column] = np.frombuffer(values, dtype=np.int32)
+
+        for column, values in columns.items():
+            self._save(column, values)
+        self._save_json('labels.json', list(label_names))
+
+    def _save(self, column, values):
+        file_path = os.path.join(self._store_dir, column + '.npy')
+        with open(file_path + '.tmp', 'wb') as column_file:
+            np.save(column_file, values)
+        os.replace(file_path + '.tmp', file_path)
+
+    def _save_json(self, file_name, data):
+        file_path = os.path.join(self._store_dir, file_name)
+        with open(file_path + '.tmp', 'w') as json_file:
+            json.dump(data, json_file)
+        os.replace(file_path + '.tmp', file_path)
+
+
+def load_annotation_store(store_dir, mmap_mode='r'):
+    """ Columns of a store written by AnnotationStoreWriter, memory mapped by default.
+
+    The 'labels' key holds the label names, label id i being labels[i - 1].
+    """
+    columns = {}
+    for column in ('image_index', 'label_id', 'file_name') + BOX_COLUMNS + IMAGE_COLUMNS:
+        columns[column] = np.load(os.path.join(store_dir, column + '.npy'), mmap_mode=mmap_mode)
+    with open(os.path.join(store_dir, 'labels.json'), 'r') as labels_file:
+        columns['labels'] = json.load(labels_file)
+    return columns
+
+
+def label_box_counts(columns):
+    """ Number of boxes of every label of a loaded store. """
+    counts = np.bincount(columns['label_id'], minlength=len(columns['labels']) + 1)
+    return {label: int(counts[index + 1]) for index, label in enumerate(columns['labels'])}
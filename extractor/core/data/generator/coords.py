@@ -0,0 +1,106 @@
+import numpy as np
+
+from ..augment import flip_points
+
+# images with up to this many points are converted in plain Python, numpy call overhead outweighs its gain below
+SCALAR_MAX_POINTS = 48
+
+
+def labels_to_points(json_labels):
+    """ Flatten labelbox polygons into one (N, 2) array of x, y points.
+
+    Returns the lowercased label names, the points and the offsets delimiting the
+    polygon of each label, label i owning points[offsets[i]:offsets[i + 1]].
+    Polygons without any point are dropped.
+    """
+    names = []
+    coords = []
+    offsets = [0]
+
+    for label, polygons in json_labels.items():
+        polygon = polygons[0]
+        if not polygon:
+            continue
+
+        names.append(label.lower())
+        for point in polygon:
+            coords.append(point['x'])
+            coords.append(point['y'])
+        offsets.append(offsets[-1] + len(polygon))
+
+    points = np.array(coords, dtype=np.float64).reshape(-1, 2)
+    return names, points, np.array(offsets, dtype=np.intp)
+
+
+def transform_points(points, x_factor, y_factor, pad_top, scaled_height, pad_left=0):
+    """ Scale, pad and flip labelbox points (origin bottom left) to image pixels (origin top left).
+
+    scaled_height is the height of the image once scaled, padding left out, so
+    y maps to pad_top + scaled_height - y / y_factor whatever the bottom padding.
+    Factors may be scalars or per point arrays, which lets a whole batch of images
+    be converted in one call. Values are truncated toward zero like int() does.
+    """
+    transformed = np.empty(points.shape, dtype=np.int64)
+    transformed[:, 0] = np.trunc(points[:, 0] / x_factor) + pad_left
+    transformed[:, 1] = pad_top + scaled_height - np.trunc(points[:, 1] / y_factor)
+    return transformed
+
+
+def bounding_boxes(points, offsets):
+    """ Axis aligned (xmin, ymin, xmax, ymax) box of each polygon, for any number of points. """
+    if len(offsets) < 2:
+        return np.empty((0, 4), dtype=points.dtype)
+
+    starts = offsets[:-1]
+    boxes = np.empty((len(starts), 4), dtype=points.dtype)
+    boxes[:, :2] = np.minimum.reduceat(points, starts, axis=0)
+    boxes[:, 2:] = np.maximum.reduceat(points, starts, axis=0)
+    return boxes
+
+
+def image_polygons(json_labels, x_factor, y_factor, pad_top, scaled_height, pad_left=0,
+                   image_width=None, image_height=None, flip_x=False, flip_y=False,
+                   scalar_max_points=SCALAR_MAX_POINTS):
+    """ Lowercased names, flat [x1, y1, x2, y2, ...] polygons and (xmin, ymin, xmax, ymax) boxes of one image.
+
+    Points are mapped like transform_points does, then mirrored like flip_points
+    when flip_x or flip_y is set. Images of at most scalar_max_points points,
+    which is what most labelled images hold, are converted point by point;
+    larger ones go through the vectorized functions above.
+    """
+    if sum(len(polygons[0]) for polygons in json_labels.values()) > scalar_max_points:
+        names, points, offsets = labels_to_points(json_labels)
+        points = transform_points(points, x_factor, y_factor, pad_top, scaled_height, pad_left)
+        if flip_x or flip_y:
+            points = flip_points(points, image_width, image_height, flip_x, flip_y)
+        xy_coords = points.ravel().tolist()
+        polygons = [xy_coords[2 * start:2 * stop] for start, stop in zip(offsets[:-1], offsets[1:])]
+        return names, polygons, [tuple(box) for box in bounding_boxes(points, offsets).tolist()]
+
+    # x = x_base + x_sign * trunc(x / x_factor), likewise for y, with any flip folded in
+    x_base, x_sign = pad_left, 1
+    y_base, y_sign = pad_top + scaled_height, -1
+    if flip_x:
+        x_base, x_sign = image_width - 1 - x_base, -x_sign
+    if flip_y:
+        y_base, y_sign = image_height - 1 - y_base, -y_sign
+
+    names = []
+    polygons = []
+    boxes = []
+    for label, label_polygons in json_labels.items():
+        polygon = label_polygons[0]
+        if not polygon:
+            continue
+
+        xy_coords = []
+        for point in polygon:
+            xy_coords.append(x_base + x_sign * int(point['x'] / x_factor))
+            xy_coords.append(y_base + y_sign * int(point['y'] / y_factor))
+        xs, ys = xy_coords[0::2], xy_coords[1::2]
+
+        names.append(label.lower())
+        polygons.append(xy_coords)
+        boxes.append((min(xs), min(ys), max(xs), max(ys)))
+
+    return names, polygons, boxes
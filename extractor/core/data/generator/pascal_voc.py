@@ -1,9 +1,12 @@
 import os
-import cv2
-from PIL import Image
-from pascal_voc_writer import Writer as PascalWriter
 
+from utils.metrics import timed
+from utils.sync import write_atomic
+
+from ..manifest import content_digest
 from .abstract.generator import AbstractGenerator
+from .coords import image_polygons
+from .voc_writer import PascalVOCWriter
 
 
 class PascalVOCGenerator(AbstractGenerator):
@@ -21,9 +24,17 @@ class PascalVOCGenerator(AbstractGenerator):
         self._x_factor = config['x_factor']
         self._y_factor = config['y_factor']
         self._pad_top = config['pad_top']
+        self._pad_bot = config['pad_bot']
         self._pad_left = config['pad_left']
         self._apply_reduction = config['apply_reduction']
+        self._debug = config.get('debug', False)
+        self._flip_x = config.get('flip_x', False)
+        self._flip_y = config.get('flip_y', False)
+        self._image = config.get('image')
         self.label_names = set()
+        self.bounding_boxes = []
+        self.output_files = {}
+        self.timings = {}
         self._execute()
 
     @property
@@ -45,11 +56,11 @@ class PascalVOCGenerator(AbstractGenerator):
     def _check_or_create_annotation_dirs(self):
         """ Check folder exist or create. """
         if not os.path.exists(self._annotation_file_path):
-            os.makedirs(self._annotation_file_path)
+            os.makedirs(self._annotation_file_path, exist_ok=True)
 
     def _create_pascal_writer(self):
         """ Create an instance of pascal writer."""
-        return PascalWriter(
+        return PascalVOCWriter(
             path=self._image_path,
             width=self._image_width,
             height=self._image_height,
@@ -62,71 +73,63 @@ class PascalVOCGenerator(AbstractGenerator):
         """ Parse labels and extract. """
         xml_writer = self._create_pascal_writer()
 
-        for label, bnd_box in self._json_labels.items():
-            bnd_box = bnd_box[0]
-            xy_coords = []
-
-            for coords in bnd_box:
-                if self._apply_reduction:
-                    x, y = self._resize_coords(coords['x'], coords['y'])
-                else:
-                    x = int(coords['x'])
-                    y = self._image_height - int(coords['y'])
-
-                xy_coords.extend([x, y])
-
-            label = label.lower()
-            self._debug_bounding_box(xy_coords, label)
+        names, polygons, boxes = image_polygons(
+            self._json_labels, self._x_factor, self._y_factor, self._pad_top,
+            self._image_height - self._pad_top - self._pad_bot, self._pad_left,
+            image_width=self._image_width, image_height=self._image_height, flip_x=self._flip_x, flip_y=self._flip_y)
 
+        for label, xy_coords, box in zip(names, polygons, boxes):
+            self.bounding_boxes.append((label, box))
             self.label_names.add(label)
             xml_writer.addObject(name=label, xy_coords=xy_coords)
 
+        if self._debug:
+            with timed(self.timings, 'render'):
+                self._debug_bounding_box(self.bounding_boxes)
+
         self._check_or_create_annotation_dirs()
         if os.path.exists(self._annotation_file_path):
-            xml_writer.save(self._xml_file_path)
+            content = xml_writer.save(self._xml_file_path)
+            self.output_files[self._xml_file_path] = content_digest(content)
             # self._logger.info(
             #     'Pascal VOC annotation file create for image {}.\n\n'.format(self._file_name))
         else:
-            self._logger.warning(
-                'WARN: Skipping file creation since it already exist at {}\n'.format(self._xml_file_path))
+            self._logger.warning('WARN: Skipping file creation since it already exist at %s', self._xml_file_path)
 
-    def _resize_coords(self, x, y):
+    def _debug_bounding_box(self, bounding_boxes):
+        """ Render every bounding box of the image in a single decode/encode pass. """
+        import cv2
 
-        new_x = int(x / self._x_factor)
-        new_y = self._image_height - int(y / self._y_factor) - self._pad_top
-        return new_x, new_y
-
-    def _debug_bounding_box(self, xy_coords, label):
-        image = cv2.imread(self._image_path)
-
-        value = 0
-
-        top_xy = tuple([xy_coords[0] - value, xy_coords[1] - value])
-        bottom_xy = tuple([xy_coords[4] + value, xy_coords[5] + value])
+        if self._image is not None:
+            image = self._image.copy()
+        else:
+            image = cv2.imread(self._image_path)
 
         font = cv2.FONT_HERSHEY_SIMPLEX
 
-        img = cv2.rectangle(image, top_xy, bottom_xy, (0, 255, 0), 1)
-        img = cv2.putText(img, label, (20, 30),
-                          font, 1, (0, 255, 0), 2, cv2.LINE_AA)
+        for label, (xmin, ymin, xmax, ymax) in bounding_boxes:
+            image = cv2.rectangle(image, (xmin, ymin), (xmax, ymax), (0, 255, 0), 1)
+            image = cv2.putText(image, label, (xmin, max(ymin - 5, 15)),
+                                font, 0.5, (0, 255, 0), 1, cv2.LINE_AA)
 
         base_name = os.path.basename(self._image_path)
 
         render_folder = os.path.join(os.path.split(self._annotation_dir)[0], 'render')
 
         if not os.path.exists(render_folder):
-            os.mkdir(render_folder)
+            os.makedirs(render_folder, exist_ok=True)
 
         file_name = os.path.join(render_folder, base_name)
 
-        cv2.imwrite(file_name, img)
+        content = cv2.imencode(os.path.splitext(file_name)[1], image)[1].tobytes()
+        write_atomic(file_name, content)
+        self.output_files[file_name] = content_digest(content)
 
     def _execute(self):
         """ Execute JSON to Pascal VOC conversion. """
         if self._json_labels != self.SKIPPED_LABEL:
-            self._logger.info(
-                'Transforming shapely wtk polygon format to pascal voc.\n')
+            self._logger.debug('Transforming labelbox polygons to pascal voc.')
             self._parse_label()
         else:
-            self._logger.warning(
-                'WARN:Skipping annotation since images has been skipped at labeling time')
+            # counted as skipped_labels in the run report
+            self._logger.debug('Skipping annotation since images has been skipped at labeling time')
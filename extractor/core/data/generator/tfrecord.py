@@ -0,0 +1,74 @@
+import hashlib
+import os
+
+from .abstract.generator import AbstractGenerator
+from .tfrecord_writer import bytes_feature, float_feature, int64_feature, serialize_example
+
+
+class TFRecordGenerator(AbstractGenerator):
+    """ Serialize one tf.train.Example per image for a sharded TFRecord dataset.
+
+    Features follow the TensorFlow object detection API layout. Objects carry their
+    class text only: ids come from label_map.pbtxt, which the object detection API
+    applies to image/object/class/text when its input reader is given label_map_path.
+    """
+
+    SKIPPED_LABEL = 'Skip'
+    IMAGE_FORMATS = {'.jpg': b'jpeg', '.jpeg': b'jpeg', '.png': b'png'}
+
+    def __init__(self, logger, config):
+        super(TFRecordGenerator, self).__init__(logger)
+        self._labelbox_id = config['labelbox_id']
+        self._image_path = config['image_path']
+        self._image_content = config['image_content']
+        self._image_width = config['image_width']
+        self._image_height = config['image_height']
+        self._bounding_boxes = config['bounding_boxes']
+        self._features = {}
+        self.record = None
+        self._execute()
+
+    def _parse_label(self):
+        """ Normalize bounding boxes to [0, 1] as expected by the object detection API. """
+        xmins, ymins, xmaxs, ymaxs, names = [], [], [], [], []
+
+        for label, xmin, ymin, xmax, ymax in self._bounding_boxes:
+            xmins.append(min(max(float(xmin) / self._image_width, 0.), 1.))
+            ymins.append(min(max(float(ymin) / self._image_height, 0.), 1.))
+            xmaxs.append(min(max(float(xmax) / self._image_width, 0.), 1.))
+            ymaxs.append(min(max(float(ymax) / self._image_height, 0.), 1.))
+            names.append(label.encode('utf-8'))
+
+        self._features.update({
+            'image/object/bbox/xmin': float_feature(xmins),
+            'image/object/bbox/ymin': float_feature(ymins),
+            'image/object/bbox/xmax': float_feature(xmaxs),
+            'image/object/bbox/ymax': float_feature(ymaxs),
+            'image/object/class/text': bytes_feature(names),
+            'image/object/difficult': int64_feature([0] * len(names)),
+            'image/object/truncated': int64_feature([0] * len(names)),
+        })
+
+    def _transform_to_format(self):
+        """ Add image features and serialize the example. """
+        file_name = os.path.basename(self._image_path)
+        image_format = self.IMAGE_FORMATS.get(os.path.splitext(file_name)[1].lower(), b'jpeg')
+
+        self._features.update({
+            'image/height': int64_feature([self._image_height]),
+            'image/width': int64_feature([self._image_width]),
+            'image/filename': bytes_feature([file_name.encode('utf-8')]),
+            'image/source_id': bytes_feature([self._labelbox_id.encode('utf-8')]),
+            'image/key/sha256': bytes_feature([hashlib.sha256(self._image_content).hexdigest().encode('utf-8')]),
+            'image/encoded': bytes_feature([self._image_content]),
+            'image/format': bytes_feature([image_format]),
+        })
+        return serialize_example(self._features)
+
+    def _debug_bounding_box(self, bounding_boxes):
+        pass
+
+    def _execute(self):
+        """ Execute image and boxes to TFRecord example conversion. """
+        self._parse_label()
+        self.record = self._transform_to_format()
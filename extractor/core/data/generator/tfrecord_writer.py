@@ -0,0 +1,211 @@
+import hashlib
+import json
+import os
+import struct
+
+from crc32c import crc32c
+
+from utils.sync import write_atomic
+
+CRC32C_MASK_DELTA = 0xa282ead8
+
+
+def masked_crc32c(data):
+    """ Checksum as stored in TFRecord files. """
+    crc = crc32c(data)
+    return (((crc >> 15) | (crc << 17)) + CRC32C_MASK_DELTA) & 0xffffffff
+
+
+def _varint(value):
+    if value < 0:
+        value += 1 << 64
+
+    encoded = bytearray()
+    while value > 0x7f:
+        encoded.append((value & 0x7f) | 0x80)
+        value >>= 7
+    encoded.append(value)
+    return bytes(encoded)
+
+
+def _length_delimited(field_number, data):
+    return _varint(field_number << 3 | 2) + _varint(len(data)) + data
+
+
+def bytes_feature(values):
+    """ Feature holding a BytesList. """
+    bytes_list = b''.join(_length_delimited(1, value) for value in values)
+    return _length_delimited(1, bytes_list)
+
+
+def float_feature(values):
+    """ Feature holding a packed FloatList. """
+    float_list = _length_delimited(1, struct.pack('<{}f'.format(len(values)), *values)) if values else b''
+    return _length_delimited(2, float_list)
+
+
+def int64_feature(values):
+    """ Feature holding a packed Int64List. """
+    int64_list = _length_delimited(1, b''.join(_varint(value) for value in values)) if values else b''
+    return _length_delimited(3, int64_list)
+
+
+def serialize_example(features):
+    """ Serialize a tf.train.Example from a dict of encoded features, keys in sorted order. """
+    entries = b''.join(
+        _length_delimited(1, _length_delimited(1, key.encode('utf-8')) + _length_delimited(2, feature))
+        for key, feature in sorted(features.items()))
+    return _length_delimited(1, entries)
+
+
+class ShardedTFRecordWriter:
+    """ Write records to fixed size TFRecord shards and index every record.
+
+    Each shard <name>-<index>.tfrecord gets a <name>-<index>.index file listing the
+    offset and size of its records, one per line. A json dataset index listing
+    every shard is written when the writer is closed.
+
+    Records are added as a key identifying their input along with a function
+    building them. Keys of a shard are hashed once it is full; when the shard
+    at the same position of the previous run had the same keys and is still on
+    disk, it is kept as is and none of its records are built.
+    """
+
+    INDEX_FILE_NAME = 'index.json'
+
+    def __init__(self, output_dir, name='trainval', shard_size=1000):
+        self._output_dir = output_dir
+        self._name = name
+        self._shard_size = shard_size
+        self._shards = []
+        self._pending = []
+        self._file = None
+        self._index_lines = []
+        self._index_digest = None
+        self._digest = None
+        self._offset = 0
+        self._records = 0
+        self.reused_shards = 0
+
+        if not os.path.exists(self._output_dir):
+            os.makedirs(self._output_dir)
+        self._previous_shards = self._load_previous_shards()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @property
+    def shard_digests(self):
+        """ Map every shard and index file written to its digest. """
+        digests = {os.path.join(self._output_dir, self.INDEX_FILE_NAME): self._index_digest}
+        for shard in self._shards:
+            digests[os.path.join(self._output_dir, shard['file'])] = shard['digest']
+            digests[os.path.join(self._output_dir, shard['index'])] = shard['index_digest']
+        return digests
+
+    def _load_previous_shards(self):
+        try:
+            with open(os.path.join(self._output_dir, self.INDEX_FILE_NAME), 'r') as index_file:
+                return json.load(index_file).get('shards', [])
+        except (OSError, ValueError):
+            return []
+
+    def _reusable_shard(self, input_digest):
+        """ Shard of the previous run at the current position, when built from the same inputs. """
+        position = len(self._shards)
+        if position >= len(self._previous_shards):
+            return None
+
+        shard = self._previous_shards[position]
+        if shard.get('input_digest') != input_digest or shard.get('records') != len(self._pending):
+            return None
+        for file_name, size in ((shard['file'], shard['bytes']), (shard['index'], None)):
+            try:
+                file_size = os.path.getsize(os.path.join(self._output_dir, file_name))
+            except OSError:
+                return None
+            if size is not None and file_size != size:
+                return None
+        return shard
+
+    def _open_shard(self):
+        base_name = '{}-{:05d}'.format(self._name, len(self._shards))
+        self._shards.append({'file': base_name + '.tfrecord', 'index': base_name + '.index'})
+        # renamed into place once complete, a hardlinked synced copy is never rewritten in place
+        self._file = open(os.path.join(self._output_dir, base_name + '.tfrecord.tmp'), 'wb')
+        self._index_lines = []
+        self._digest = hashlib.sha1()
+        self._offset = 0
+        self._records = 0
+
+    def _close_shard(self):
+        self._file.close()
+        self._file = None
+        shard_path = os.path.join(self._output_dir, self._shards[-1]['file'])
+        os.replace(shard_path + '.tmp', shard_path)
+
+        index_content = ''.join(self._index_lines).encode('utf-8')
+        write_atomic(os.path.join(self._output_dir, self._shards[-1]['index']), index_content)
+
+        self._shards[-1].update({
+            'records': self._records,
+            'bytes': self._offset,
+            'digest': self._digest.hexdigest(),
+            'index_digest': hashlib.sha1(index_content).hexdigest(),
+        })
+
+    def _write_record(self, record):
+        length = struct.pack('<Q', len(record))
+        data = b''.join((length, struct.pack('<I', masked_crc32c(length)),
+                         record, struct.pack('<I', masked_crc32c(record))))
+        self._file.write(data)
+        self._digest.update(data)
+        self._index_lines.append('{} {}\n'.format(self._offset, len(data)))
+        self._offset += len(data)
+        self._records += 1
+
+    def _flush_shard(self):
+        input_digest = hashlib.sha1()
+        for key, _ in self._pending:
+            input_digest.update(key.encode('utf-8'))
+        input_digest = input_digest.hexdigest()
+
+        shard = self._reusable_shard(input_digest)
+        if shard is not None:
+            self._shards.append(shard)
+            self.reused_shards += 1
+        else:
+            self._open_shard()
+            for _, build_record in self._pending:
+                self._write_record(build_record())
+            self._close_shard()
+            self._shards[-1]['input_digest'] = input_digest
+        self._pending = []
+
+    def add(self, key, build_record):
+        """ Queue a record, build_record only being called when its shard has to be written. """
+        self._pending.append((key, build_record))
+        if len(self._pending) >= self._shard_size:
+            self._flush_shard()
+
+    def close(self):
+        if self._pending:
+            self._flush_shard()
+
+        # drop shards left over by a previous, larger run
+        shard_files = set()
+        for shard in self._shards:
+            shard_files.update((shard['file'], shard['index']))
+        for file_name in os.listdir(self._output_dir):
+            if file_name.startswith(self._name + '-') and file_name not in shard_files:
+                os.remove(os.path.join(self._output_dir, file_name))
+
+        index_content = json.dumps({
+            'records': sum(shard['records'] for shard in self._shards),
+            'shards': self._shards,
+        }, indent=2).encode('utf-8')
+        write_atomic(os.path.join(self._output_dir, self.INDEX_FILE_NAME), index_content)
+        self._index_digest = hashlib.sha1(index_content).hexdigest()
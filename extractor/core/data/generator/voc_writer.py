@@ -0,0 +1,82 @@
+import os
+
+from utils.sync import write_atomic
+
+HEADER_TEMPLATE = (
+    '<annotation>\n'
+    '    <folder>{folder}</folder>\n'
+    '    <filename>{filename}</filename>\n'
+    '    <path>{path}</path>\n'
+    '    <source>\n'
+    '        <database>{database}</database>\n'
+    '    </source>\n'
+    '    <size>\n'
+    '        <width>{width}</width>\n'
+    '        <height>{height}</height>\n'
+    '        <depth>{depth}</depth>\n'
+    '    </size>\n'
+    '    <segmented>{segmented}</segmented>\n'
+)
+OBJECT_OPEN = '    <object>\n        <name>'
+OBJECT_POSE = '</name>\n        <pose>'
+OBJECT_TRUNCATED = '</pose>\n        <truncated>'
+OBJECT_DIFFICULT = '</truncated>\n        <difficult>'
+OBJECT_POLYGON = '</difficult>\n        <polygon>\n'
+OBJECT_CLOSE = '        </polygon>\n    </object>'
+FOOTER = '\n</annotation>\n'
+
+# (open x, close x + open y, close y) fragments of the n-th polygon point, grown on demand
+_POINT_TAGS = []
+
+
+def _point_tags(count):
+    while len(_POINT_TAGS) < count:
+        index = len(_POINT_TAGS) + 1
+        _POINT_TAGS.append((
+            '            <x{}>'.format(index),
+            '</x{0}>\n            <y{0}>'.format(index),
+            '</y{}>\n'.format(index)))
+    return _POINT_TAGS
+
+
+class PascalVOCWriter:
+    """ Pascal VOC annotation serializer producing the same bytes as pascal_voc_writer.Writer.
+
+    Documents are assembled from precomputed string fragments instead of rendering
+    a Jinja template for every image.
+    """
+
+    def __init__(self, path, width, height, depth=3, database='Unknown', segmented=0):
+        abspath = os.path.abspath(path)
+        self._header = HEADER_TEMPLATE.format(
+            folder=os.path.basename(os.path.dirname(abspath)),
+            filename=os.path.basename(abspath),
+            path=abspath,
+            database=database,
+            width=width,
+            height=height,
+            depth=depth,
+            segmented=segmented)
+        self._parts = []
+
+    def addObject(self, name, xy_coords, pose='Unspecified', truncated=0, difficult=0):
+        parts = self._parts
+        parts.extend((OBJECT_OPEN, str(name), OBJECT_POSE, str(pose), OBJECT_TRUNCATED, str(truncated),
+                      OBJECT_DIFFICULT, str(difficult), OBJECT_POLYGON))
+
+        point_tags = _point_tags(len(xy_coords) // 2)
+        for index in range(0, len(xy_coords) - 1, 2):
+            open_x, close_x_open_y, close_y = point_tags[index // 2]
+            parts.extend((open_x, str(xy_coords[index]), close_x_open_y, str(xy_coords[index + 1]), close_y))
+
+        parts.append(OBJECT_CLOSE)
+
+    def render(self):
+        """ Serialize annotation to a string. """
+        return self._header + ''.join(self._parts) + FOOTER
+
+    def save(self, annotation_path):
+        """ Write annotation to annotation_path and return the encoded bytes. """
+        content = self.render().encode('utf-8')
+        write_atomic(annotation_path, content)
+        return content
@@ -0,0 +1,185 @@
+import fcntl
+import hashlib
+import json
+import os
+import tempfile
+import threading
+
+from .manifest import content_digest
+
+
+def url_digest(url):
+    return hashlib.sha1(url.encode('utf-8')).hexdigest()
+
+
+class ImageCache:
+    """ Content addressed image cache shared by every run, output folder and process.
+
+    Layout of cache_dir:
+        objects/ab/<sha1 of content> -- image bytes, stored once however many urls serve them.
+        urls/cd/<sha1 of url>.json   -- url, ETag, Last-Modified, content digest and size.
+
+    Files are written to a temporary name and renamed into place, so concurrent
+    processes only ever see complete entries. Reading an object bumps its mtime,
+    which is what least recently used eviction goes by once the cache grows
+    past max_bytes. Eviction holds an exclusive lock on cache_dir/.lock, a
+    process finding it held leaves eviction to the holder.
+
+    Other processes may evict any object at any time, a file vanishing between
+    two calls is a miss, never an error. Each process rescans the cache under
+    the lock every time it stored a tenth of max_bytes, so processes sharing
+    the cache overshoot its limit by at most that much each.
+    """
+
+    LOCK_FILE_NAME = '.lock'
+    # evict down to this share of max_bytes, so eviction does not run on every store
+    EVICTION_TARGET = 0.9
+    # share of max_bytes stored by this process between two rescans of the whole cache
+    RESCAN_SHARE = 0.1
+
+    def __init__(self, cache_dir, max_bytes=10 << 30):
+        self._cache_dir = cache_dir
+        self._objects_dir = os.path.join(cache_dir, 'objects')
+        self._urls_dir = os.path.join(cache_dir, 'urls')
+        self._max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # bytes this process stored since it last scanned the cache
+        self._unscanned = 0
+
+        for directory in (self._objects_dir, self._urls_dir):
+            os.makedirs(directory, exist_ok=True)
+        self._size = self._scan_size()
+
+    def __str__(self):
+        return 'An image cache at {} holding up to {} bytes'.format(self._cache_dir, self._max_bytes)
+
+    def _object_path(self, digest):
+        return os.path.join(self._objects_dir, digest[:2], digest)
+
+    def _url_path(self, url):
+        digest = url_digest(url)
+        return os.path.join(self._urls_dir, digest[:2], digest + '.json')
+
+    def _scan_size(self):
+        return sum(object_size for _, object_size, _ in self._scan_objects())
+
+    def _scan_objects(self):
+        """ (mtime, size, path) of every object, leaving out those evicted while scanning. """
+        for prefix in os.scandir(self._objects_dir):
+            if not prefix.is_dir():
+                continue
+            try:
+                entries = list(os.scandir(prefix.path))
+            except FileNotFoundError:
+                continue
+            for entry in entries:
+                if entry.name.endswith('.tmp'):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                yield stat.st_mtime, stat.st_size, entry.path
+
+    @staticmethod
+    def _write_atomic(file_path, data):
+        directory = os.path.dirname(file_path)
+        os.makedirs(directory, exist_ok=True)
+        file_descriptor, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(file_descriptor, 'wb') as tmp_file:
+                tmp_file.write(data)
+            os.replace(tmp_path, file_path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+    def lookup(self, url):
+        """ Record stored for url, None when the url was never cached. """
+        try:
+            with open(self._url_path(url), 'r') as record_file:
+                record = json.load(record_file)
+        except (OSError, ValueError):
+            return None
+
+        return record if record.get('url') == url else None
+
+    def read(self, record):
+        """ Content of a record, None when it was evicted meanwhile. """
+        object_path = self._object_path(record['digest'])
+        try:
+            with open(object_path, 'rb') as object_file:
+                content = object_file.read()
+        except OSError:
+            return None
+
+        try:
+            os.utime(object_path)
+        except FileNotFoundError:
+            # evicted since it was read, the content is still good for this run
+            pass
+        return content
+
+    def get(self, url):
+        record = self.lookup(url)
+        return self.read(record) if record is not None else None
+
+    def store(self, url, content, etag=None, last_modified=None):
+        """ Cache content fetched from url along with its validators. """
+        digest = content_digest(content)
+        object_path = self._object_path(digest)
+
+        try:
+            os.utime(object_path)
+        except FileNotFoundError:
+            self._write_atomic(object_path, content)
+            with self._lock:
+                self._size += len(content)
+                self._unscanned += len(content)
+
+        record = {
+            'url': url,
+            'etag': etag,
+            'last_modified': last_modified,
+            'digest': digest,
+            'size': len(content),
+        }
+        self._write_atomic(self._url_path(url), json.dumps(record).encode('utf-8'))
+
+        if self._size > self._max_bytes or self._unscanned > self._max_bytes * self.RESCAN_SHARE:
+            self.evict()
+
+    def evict(self):
+        """ Rescan the cache and remove least recently used objects when it outgrew its size limit.
+
+        The size comes from the scan done under the lock, not from what this
+        process stored, so objects added by other processes count as well.
+        """
+        with self._lock:
+            self._unscanned = 0
+
+        with open(os.path.join(self._cache_dir, self.LOCK_FILE_NAME), 'a') as lock_file:
+            try:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return
+
+            try:
+                objects = sorted(self._scan_objects())
+                size = sum(object_size for _, object_size, _ in objects)
+                target = self._max_bytes * self.EVICTION_TARGET if size > self._max_bytes else size
+
+                for _, object_size, object_path in objects:
+                    if size <= target:
+                        break
+                    try:
+                        os.remove(object_path)
+                    except FileNotFoundError:
+                        pass
+                    size -= object_size
+
+                # url records of evicted objects become misses, read() tells them apart
+                with self._lock:
+                    self._size = size
+            finally:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
@@ -0,0 +1,54 @@
+import struct
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+JPEG_SOI = b'\xff\xd8'
+# start of frame markers holding the image size (excludes DHT, JPG and DAC)
+JPEG_SOF_MARKERS = {0xc0, 0xc1, 0xc2, 0xc3, 0xc5, 0xc6, 0xc7, 0xc9, 0xca, 0xcb, 0xcd, 0xce, 0xcf}
+
+
+def read_image_size(data):
+    """ Read (width, height) from the encoded image header without decoding pixels.
+
+    Supports JPEG, PNG, GIF and BMP. Returns None when the format is unknown or
+    the header is truncated.
+    """
+    try:
+        if data[:2] == JPEG_SOI:
+            return _read_jpeg_size(data)
+        if data[:8] == PNG_SIGNATURE:
+            return struct.unpack('>II', data[16:24])
+        if data[:6] == b'GIF87a' or data[:6] == b'GIF89a':
+            return struct.unpack('<HH', data[6:10])
+        if data[:2] == b'BM':
+            width, height = struct.unpack('<ii', data[18:26])
+            return width, abs(height)
+    except struct.error:
+        pass
+
+    return None
+
+
+def _read_jpeg_size(data):
+    """ Walk JPEG segments until the start of frame marker. """
+    position = 2
+    while position + 9 < len(data):
+        if data[position] != 0xff:
+            return None
+
+        marker = data[position + 1]
+        # fill bytes and standalone markers carry no length
+        if marker == 0xff:
+            position += 1
+            continue
+        if marker == 0x01 or 0xd0 <= marker <= 0xd7:
+            position += 2
+            continue
+
+        if marker in JPEG_SOF_MARKERS:
+            height, width = struct.unpack('>HH', data[position + 5:position + 9])
+            return width, height
+
+        segment_length = struct.unpack('>H', data[position + 2:position + 4])[0]
+        position += 2 + segment_length
+
+    return None
@@ -1,24 +1,33 @@
-import Augmentor
 import os
-import json
-import requests
 import cv2
-import datetime as dt
 import numpy as np
-from PIL import Image
-from shapely import wkt
-from pascal_voc_writer import Writer as PascalWriter
 
+from utils.metrics import timed
+from utils.sync import write_atomic
+
+from .augment import augment_batch, draw_params, variant_seed
 from .generator.pascal_voc import PascalVOCGenerator
+from .image_header import read_image_size
+from .local_source import close_mapped, link_image, map_file
+from .manifest import content_digest, label_digest
+from .resize_plan import resize_pyramid
+from .summary import SKIPPED_LABEL, LabeledImageSummary, image_file_path, split_file_name
+
+
+def process_labeled_image(job):
+    """ Run the per-image stages and return the small picklable summary needed by the parser. """
+    logger, image_content, entry = job
+    image = LabeledImagePascalVOC(logger, image_content=image_content, **entry)
+    return image.summary()
 
 
 class LabeledImagePascalVOC:
     """ Custom class matching returned json object of labelbox.io. """
 
     ANNOTATION_PASCAL_VOC = 'Pascal VOC'
-    SKIPPED_LABEL = 'Skip'
+    SKIPPED_LABEL = SKIPPED_LABEL
 
-    def __init__(self, logger, *args, **kwargs):
+    def __init__(self, logger, *args, image_content=None, **kwargs):
         self._logger = logger(__name__)
         self._id = kwargs['ID']
         self._source_img_url = kwargs['Labeled Data']
@@ -30,103 +39,196 @@ class LabeledImagePascalVOC:
         self._annotations_dir = kwargs['Annotations Dir']
         self._required_img_height = kwargs['Required Image Height']
         self._required_img_width = kwargs['Required Image Width']
+        self._render = kwargs.get('Render Debug', False)
+        self._local_image_path = kwargs.get('Local Image Path')
+        self._local_link_mode = kwargs.get('Local Link Mode', 'symlink')
+        self._extra_resolutions = kwargs.get('Extra Resolutions', ())
+        self._augmentation = kwargs.get('Augmentation')
+        self._json_labels = kwargs['Label']
         self.label_names = set()
-        self._file_name = self._source_img_url.rsplit('/', 1)[-1].split('.')[0]
-        self._file_ext = '.' + \
-            self._source_img_url.split("/")[-1].split('.')[1]
-        self._download_image(kwargs['Label'])
-        self._resize_image(self._image_file_path)
-        self._generate_pascal_voc_file(logger, kwargs['Label'], apply_reduction=True, debug=True)
-
-    def _download_image(self, json_labels):
-        """ Download image from provided link (Cloud link)."""
-        file_name = self._file_name + self._file_ext
-        self._image_file_path = os.path.join(self._images_dir, file_name)
-
-        if not os.path.exists(self._image_file_path):
-            try:
-                response = requests.get(self._source_img_url, stream=True)
-                response.raw.decode_content = True
-                image = Image.open(response.raw)
-                self._img_width, self._img_height = image.size
-                image.save(self._image_file_path, format=image.format)
-                self._logger.info('Downloaded image form source {} at {}'.format(
-                    self._source_img_url, self._image_file_path))
-
-            except requests.exceptions.MissingSchema as e:
-                self._logger.exception(
-                    '"source_image_url" attribute must be a URL.')
-            except requests.exceptions.ConnectionError as e:
-                self._logger.exception(
-                    'Failed to fetch image from {}'.format(self._source_img_url))
+        self.bounding_boxes = []
+        self.output_files = {}
+        self.timings = {}
+        self.variants = []
+        self._file_name, self._file_ext = self.split_file_name(self._source_img_url)
+        image_content = self._save_image(image_content)
+        self._resize_image(image_content)
+        close_mapped(image_content)
+        self._generate_pascal_voc_file(logger, self._json_labels, apply_reduction=True, debug=self._render)
+        self._generate_extra_resolution_files(logger)
+        self._generate_augmented_files(logger)
+
+    def summary(self):
+        """ Summarize the extracted image so it can cross a process boundary cheaply. """
+        return LabeledImageSummary(
+            labelbox_id=self._id,
+            file_name=self._file_name,
+            image_path=self._resized_image_path,
+            label_names=tuple(sorted(self.label_names)),
+            boxes=tuple((label,) + box for label, box in self.bounding_boxes),
+            label_hash=label_digest(self._json_labels),
+            source_url=self._source_img_url,
+            target_size=(self._required_img_width, self._required_img_height),
+            extra_sizes=tuple(tuple(resolution['Size']) for resolution in self._extra_resolutions),
+            rendered=self._render,
+            x_factor=self._x_factor,
+            y_factor=self._y_factor,
+            pad_top=self._pad_top,
+            pad_left=self._pad_left,
+            augmentation=self._augmentation,
+            variants=tuple(self.variants),
+            outputs=self.output_files,
+            timings=self.timings)
+
+    split_file_name = staticmethod(split_file_name)
+    image_file_path = staticmethod(image_file_path)
+
+    def _save_image(self, image_content):
+        """ Write the raw bytes fetched by the download stage, or map the ones already on disk.
+
+        Local source images are linked into the images folder, or referenced in
+        place, rather than copied. Files on disk are memory mapped and decoded
+        from the mapping. Image dimensions are read from the encoded header so
+        the bytes are never decoded just to be re-encoded.
+        """
+        self._image_file_path = self.image_file_path(self._images_dir, self._source_img_url)
+
+        if self._local_image_path is not None:
+            link_image(self._local_image_path, self._image_file_path, self._local_link_mode)
+            image_content = map_file(self._local_image_path)
+            self._logger.debug('Using local image %s for source %s', self._local_image_path, self._source_img_url)
+        elif image_content is not None:
+            write_atomic(self._image_file_path, image_content)
+            self._logger.debug('Downloaded image form source %s at %s', self._source_img_url, self._image_file_path)
         else:
-            image = Image.open(self._image_file_path)
-            self._img_width, self._img_height = image.size
-            self._logger.warn('WARN: Skipping file download since it already exist @ {}\n'.format(
-                self._image_file_path))
+            image_content = map_file(self._image_file_path)
+            self._logger.debug('Skipping file download since it already exist @ %s', self._image_file_path)
 
-    def _resize_image(self, image_path):
+        self._img_width, self._img_height = read_image_size(image_content) or (None, None)
+
+        return image_content
+
+    def _resize_image(self, image_content):
         file_name = self._file_name + self._file_ext
         self._resized_image_path = os.path.join(
             self._resized_image_dir, file_name)
 
-        img = cv2.imread(image_path)
+        # single decode of the image, every later stage works on this array
+        with timed(self.timings, 'decode'):
+            img = cv2.imdecode(np.frombuffer(image_content, dtype=np.uint8), cv2.IMREAD_COLOR)
 
         height, width = img.shape[:2]
+        if self._img_width is None:
+            self._img_width, self._img_height = width, height
 
-        self._aspect_ratio = float(width)/height
-
-        scaled_height = 300
-        scaled_width = 300
-
-        # interpolation method
-        if height > self._required_img_height or width > self._required_img_width:  # shrinking image
-            interp = cv2.INTER_AREA
-        else:  # stretching image
-            interp = cv2.INTER_CUBIC
-
-        # aspect ratio of image
-
-        # compute scaling and pad sizing
-        if self._aspect_ratio > 1:  # horizontal image
-            new_width = scaled_width
-            new_height = np.round(new_width/self._aspect_ratio).astype(int)
-            pad_vert = (scaled_height-new_height)/2
-            self._pad_top, self._pad_bot = np.floor(
-                pad_vert).astype(int), np.ceil(pad_vert).astype(int)
-            self._pad_left, self._pad_right = 0, 0
-        elif self._aspect_ratio < 1:  # vertical image
-            new_height = scaled_height
-            new_width = np.round(new_height*self._aspect_ratio).astype(int)
-            pad_horz = (scaled_width-new_width)/2
-            self._pad_left, self._pad_right = np.floor(
-                pad_horz).astype(int), np.ceil(pad_horz).astype(int)
-            self._pad_top, self._pad_bot = 0, 0
-        else:  # square image
-            new_height, new_width = scaled_height, scaled_width
-            self._pad_left, self._pad_right, self._pad_top, self._pad_bot = 0, 0, 0, 0
-
-        # factors to scale bounding box values
-        self._x_factor = float(width) / self._required_img_width
-        self._y_factor = float(height) / (self._required_img_height - self._pad_bot - self._pad_top)
-
-        # set pad color
-        # color image but only one color provided
-        if len(img.shape) is 3 and not isinstance(0, (list, tuple, np.ndarray)):
-            padColor = [0]*3
-
-        # scale and pad
-        scaled_img = cv2.resize(img, (new_width, new_height), interpolation=interp)
-        scaled_img = cv2.copyMakeBorder(
-            scaled_img, self._pad_top, self._pad_bot, self._pad_left, self._pad_right, borderType=cv2.BORDER_CONSTANT, value=0)
-
-        if not os.path.exists(self._resized_image_path):
-            cv2.imwrite(self._resized_image_path, scaled_img)
-            self._logger.info('Resized image at {}.jpg'.format(
-                self._resized_image_path))
-        else:
-            self._logger.warn('WARN: Skipping file resizing since it already exist @ {}\n'.format(
-                self._resized_image_path))
+        # images of the same resolution share precomputed plans and output buffers,
+        # extra resolutions are derived from the larger results when possible
+        target_sizes = [(self._required_img_width, self._required_img_height)]
+        target_sizes.extend(resolution['Size'] for resolution in self._extra_resolutions)
+        with timed(self.timings, 'resize'):
+            resized = resize_pyramid(img, target_sizes)
+
+        plan, scaled_img = resized[0]
+        self._x_factor, self._y_factor = plan.x_factor, plan.y_factor
+        self._pad_top, self._pad_bot = plan.pad_top, plan.pad_bot
+        self._pad_left, self._pad_right = plan.pad_left, plan.pad_right
+        self._resized_image = scaled_img
+        self._write_resized_image(self._resized_image_path, scaled_img)
+
+        self._extra_resized_images = []
+        for resolution, (plan, scaled_img) in zip(self._extra_resolutions, resized[1:]):
+            resized_image_path = os.path.join(resolution['Resized Image Dir'], file_name)
+            self._write_resized_image(resized_image_path, scaled_img)
+            self._extra_resized_images.append((resolution, plan, resized_image_path, scaled_img))
+
+    def _write_resized_image(self, resized_image_path, scaled_img):
+        # always written: the manifest only lets changed entries reach this point
+        with timed(self.timings, 'encode'):
+            resized_content = cv2.imencode(self._file_ext, scaled_img)[1].tobytes()
+            write_atomic(resized_image_path, resized_content)
+        self.output_files[resized_image_path] = content_digest(resized_content)
+        self._logger.debug('Resized image at %s', resized_image_path)
+
+    def _generate_augmented_files(self, logger):
+        """ Resized images and Pascal VOC annotations of every augmented variant, at every resolution.
+
+        Variants are computed together from the resized arrays still in memory, and
+        named after the image with an _aug<index> suffix. Every resolution gets the
+        same flips and gains, so trainval and the splits list the same images in
+        each output folder; the summary keeps the boxes of the main one.
+        """
+        if not self._augmentation or self._json_labels == self.SKIPPED_LABEL:
+            return
+
+        with timed(self.timings, 'augment'):
+            params = draw_params(self._augmentation['variants'], self._augmentation['operations'],
+                                 variant_seed(self._augmentation['seed'], self._id))
+
+        targets = [(self._resized_image_dir, self._annotations_dir, self._resized_image,
+                    (self._required_img_width, self._required_img_height),
+                    self._x_factor, self._y_factor, self._pad_top, self._pad_bot, self._pad_left)]
+        for resolution, plan, _, scaled_img in self._extra_resized_images:
+            targets.append((resolution['Resized Image Dir'], resolution['Annotations Dir'], scaled_img,
+                            resolution['Size'], plan.x_factor, plan.y_factor, plan.pad_top, plan.pad_bot,
+                            plan.pad_left))
+
+        for target_index, target in enumerate(targets):
+            (resized_dir, annotations_dir, image, (width, height),
+             x_factor, y_factor, pad_top, pad_bot, pad_left) = target
+            with timed(self.timings, 'augment'):
+                batch = augment_batch(image, params)
+
+            for index, variant_image in enumerate(batch):
+                file_name = '{}_aug{}'.format(self._file_name, index)
+                resized_image_path = os.path.join(resized_dir, file_name + self._file_ext)
+                self._write_resized_image(resized_image_path, variant_image)
+
+                config = {
+                    'labelbox_id': self._id,
+                    'project_name': self._project_name,
+                    'json_labels': self._json_labels,
+                    'annotation_dir': annotations_dir,
+                    'apply_reduction': True,
+                    'debug': self._render,
+                    'image_path': resized_image_path,
+                    'image': variant_image,
+                    'image_width': width,
+                    'image_height': height,
+                    'x_factor': x_factor,
+                    'y_factor': y_factor,
+                    'pad_top': pad_top,
+                    'pad_bot': pad_bot,
+                    'pad_left': pad_left,
+                    'flip_x': bool(params.flip_x[index]),
+                    'flip_y': bool(params.flip_y[index]),
+                }
+                generator = self._run_generator(logger, config)
+                if target_index == 0:
+                    boxes = tuple((label,) + box for label, box in generator.bounding_boxes)
+                    self.variants.append((file_name, boxes))
+
+    def _generate_extra_resolution_files(self, logger):
+        """ Pascal VOC annotations of every extra resolution, boxes stay those of the main one. """
+        for resolution, plan, resized_image_path, scaled_img in self._extra_resized_images:
+            width, height = resolution['Size']
+            config = {
+                'labelbox_id': self._id,
+                'project_name': self._project_name,
+                'json_labels': self._json_labels,
+                'annotation_dir': resolution['Annotations Dir'],
+                'apply_reduction': True,
+                'debug': self._render,
+                'image_path': resized_image_path,
+                'image': scaled_img,
+                'image_width': width,
+                'image_height': height,
+                'x_factor': plan.x_factor,
+                'y_factor': plan.y_factor,
+                'pad_top': plan.pad_top,
+                'pad_bot': plan.pad_bot,
+                'pad_left': plan.pad_left,
+            }
+            self._run_generator(logger, config)
 
     def _generate_pascal_voc_file(self, logger, json_labels, apply_reduction=False, debug=False):
         """ Transform WKT polygon to pascal voc. """
@@ -142,22 +244,37 @@ class LabeledImagePascalVOC:
         if apply_reduction:
             config.update({
                 'image_path': self._resized_image_path,
+                'image': self._resized_image,
                 'image_width': self._required_img_width,
                 'image_height': self._required_img_height,
                 'x_factor': self._x_factor,
                 'y_factor': self._y_factor,
                 'pad_top': self._pad_top,
+                'pad_bot': self._pad_bot,
                 'pad_left': self._pad_left,
             })
         else:
             config.update({
                 'image_path': self._image_file_path,
+                'image': None,
                 'image_width': self._img_width,
                 'image_height': self._img_height,
                 'x_factor': 1,
                 'y_factor': 1,
                 'pad_top': 0,
+                'pad_bot': 0,
                 'pad_left': 0,
             })
-        generator = PascalVOCGenerator(logger, config)
+        generator = self._run_generator(logger, config)
         self.label_names.update(generator.label_names)
+        self.bounding_boxes.extend(generator.bounding_boxes)
+
+    def _run_generator(self, logger, config):
+        with timed(self.timings, 'annotate'):
+            generator = PascalVOCGenerator(logger, config)
+        # rendering is timed by the generator and reported as its own stage
+        if 'render' in generator.timings:
+            self.timings['render'] = self.timings.get('render', 0.) + generator.timings['render']
+            self.timings['annotate'] -= generator.timings['render']
+        self.output_files.update(generator.output_files)
+        return generator
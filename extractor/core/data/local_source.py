@@ -0,0 +1,95 @@
+import errno
+import mmap
+import os
+
+FILE_URL_PREFIX = 'file://'
+
+
+def map_file(file_path):
+    """ Read only memory map of file_path, bytes when the file is empty and cannot be mapped. """
+    with open(file_path, 'rb') as mapped_file:
+        if os.fstat(mapped_file.fileno()).st_size == 0:
+            return b''
+        # the mapping stays valid once the file is closed
+        return mmap.mmap(mapped_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def close_mapped(content):
+    if isinstance(content, mmap.mmap):
+        content.close()
+
+
+class LocalSource:
+    """ Resolve image urls to files already on a local or network disk.
+
+    Each url prefix maps to a local root, the rest of the url being the path
+    below that root; the longest matching prefix wins. file:// urls always
+    resolve to their own path.
+    """
+
+    LINK_MODES = ('symlink', 'hardlink', 'reference')
+
+    def __init__(self, prefixes=None):
+        self._prefixes = sorted((prefixes or {}).items(), key=lambda item: len(item[0]), reverse=True)
+
+    def __str__(self):
+        return 'A local image source for {} url prefixes'.format(len(self._prefixes))
+
+    @classmethod
+    def parse(cls, mappings):
+        """ Build from PREFIX=ROOT strings, as given on the command line. """
+        prefixes = {}
+        for mapping in mappings or ():
+            prefix, separator, root = mapping.rpartition('=')
+            if not separator or not prefix or not root:
+                raise ValueError('Local source {} must be formatted as PREFIX=ROOT'.format(mapping))
+            prefixes[prefix] = root
+        return cls(prefixes)
+
+    def resolve(self, url):
+        """ Local path of url, None when no prefix matches. """
+        if url.startswith(FILE_URL_PREFIX):
+            return url[len(FILE_URL_PREFIX):]
+
+        for prefix, root in self._prefixes:
+            if url.startswith(prefix):
+                return os.path.join(root, url[len(prefix):].lstrip('/'))
+
+        return None
+
+
+def link_image(source_path, image_path, mode='symlink'):
+    """ Make image_path point to source_path instead of holding a copy of it.
+
+    symlink and hardlink replace whatever image_path held, reference leaves
+    images/ untouched and the original is read in place. Nothing is done when
+    image_path already resolves to the source, which is the case when a source
+    root is the images/ folder itself: replacing it would destroy the only copy.
+    """
+    if mode == 'reference':
+        return
+
+    source_path = os.path.abspath(source_path)
+    if mode == 'symlink':
+        # an existing link to the source, or the source itself when it lives in images/
+        if os.path.realpath(source_path) == os.path.realpath(image_path):
+            return
+    elif os.path.exists(image_path) and not os.path.islink(image_path) and os.path.samefile(source_path, image_path):
+        # the source itself or a hardlink of it, a symlink still gets replaced by a hardlink
+        return
+
+    tmp_path = image_path + '.link'
+    if os.path.lexists(tmp_path):
+        os.remove(tmp_path)
+
+    if mode == 'hardlink':
+        try:
+            os.link(source_path, tmp_path)
+        except OSError as e:
+            # across filesystems, e.g. an NFS source
+            if e.errno != errno.EXDEV:
+                raise
+            os.symlink(source_path, tmp_path)
+    else:
+        os.symlink(source_path, tmp_path)
+    os.replace(tmp_path, image_path)
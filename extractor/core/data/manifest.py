@@ -0,0 +1,124 @@
+import hashlib
+import json
+import os
+
+
+def content_digest(data):
+    """ Digest identifying file or label content. """
+    return hashlib.sha1(data).hexdigest()
+
+
+def label_digest(json_labels):
+    """ Digest of a labelbox label, independent of key ordering in the export. """
+    data = json.dumps(json_labels, sort_keys=True, separators=(',', ':'))
+    return content_digest(data.encode('utf-8'))
+
+
+class ExtractionManifest:
+    """ Record of what each labelbox entry produced, used to only reprocess what changed.
+
+    Every entry is keyed by its labelbox ID and holds the hash of its label json,
+    its source url, the target size and the digest of each output file. Output
+    paths are stored relative to the manifest folder.
+    """
+
+    FILE_NAME = 'manifest.json'
+    VERSION = 5
+
+    def __init__(self, logger, output_dir):
+        self._logger = logger(__name__)
+        self._root = output_dir
+        self._file_path = os.path.join(output_dir, self.FILE_NAME)
+        self._entries = {}
+        self._synced = {}
+        self._load()
+
+    def __str__(self):
+        return 'An extraction manifest at {}'.format(self._file_path)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _load(self):
+        if not os.path.exists(self._file_path):
+            return
+
+        try:
+            with open(self._file_path, 'r') as manifest_file:
+                data = json.load(manifest_file)
+        except ValueError:
+            self._logger.warning(
+                'WARN: Ignoring unreadable manifest %s, every entry will be processed', self._file_path)
+            return
+
+        if data.get('version') != self.VERSION:
+            self._logger.warning('WARN: Ignoring manifest %s written by another version', self._file_path)
+            return
+
+        self._entries = data['entries']
+        self._synced = data['synced']
+
+    def save(self):
+        """ Atomically write manifest to disk. """
+        data = {
+            'version': self.VERSION,
+            'entries': self._entries,
+            'synced': self._synced,
+        }
+
+        tmp_file_path = self._file_path + '.tmp'
+        with open(tmp_file_path, 'w') as manifest_file:
+            json.dump(data, manifest_file)
+        os.replace(tmp_file_path, self._file_path)
+
+    def _absolute_outputs(self, record):
+        return {os.path.join(self._root, path): digest for path, digest in record['outputs'].items()}
+
+    def lookup(self, entry, target_size, render=False, extra_sizes=(), augmentation=None):
+        """ Return the recorded entry when it is up to date and its outputs still exist, else None. """
+        record = self._entries.get(entry['ID'])
+        if record is None:
+            return None
+
+        if (record['label_hash'] != label_digest(entry['Label'])
+                or record['source_url'] != entry['Labeled Data']
+                or tuple(record['target_size']) != tuple(target_size)
+                or tuple(map(tuple, record.get('extra_sizes', ()))) != tuple(extra_sizes)
+                or record.get('augmentation') != augmentation
+                or (render and not record['rendered'])):
+            return None
+
+        outputs = self._absolute_outputs(record)
+        if not all(os.path.exists(path) for path in outputs):
+            return None
+
+        return dict(record, image_path=os.path.join(self._root, record['image_path']), outputs=outputs,
+                    extra_sizes=record.get('extra_sizes', ()), timings={})
+
+    def source_url_changed(self, entry):
+        """ Whether the image stored for entry was downloaded from another url. """
+        record = self._entries.get(entry['ID'])
+        return record is not None and record['source_url'] != entry['Labeled Data']
+
+    def record(self, labelbox_id, record):
+        outputs = {os.path.relpath(path, self._root): digest for path, digest in record['outputs'].items()}
+        record = dict(record, image_path=os.path.relpath(record['image_path'], self._root), outputs=outputs)
+        # timings only describe the run that produced the record
+        record.pop('timings', None)
+        self._entries[labelbox_id] = record
+
+    def retain(self, labelbox_ids):
+        """ Forget entries that are no longer part of the export. """
+        for labelbox_id in set(self._entries) - set(labelbox_ids):
+            del self._entries[labelbox_id]
+
+    def output_digests(self):
+        """ Map absolute output path to digest for every recorded entry. """
+        digests = {}
+        for record in self._entries.values():
+            digests.update(self._absolute_outputs(record))
+        return digests
+
+    def synced_digests(self, dest_dir):
+        """ Digests of files last copied into dest_dir, updated in place by the caller. """
+        return self._synced.setdefault(os.path.abspath(dest_dir), {})
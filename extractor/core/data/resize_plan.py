@@ -0,0 +1,143 @@
+import threading
+from functools import lru_cache
+
+import cv2
+import numpy as np
+
+# every image of one source resolution shares a plan, datasets hold a handful of them
+PLAN_CACHE_SIZE = 64
+
+
+class ResizePlan:
+    """ How images of one source size are letterboxed into one target size.
+
+    The image is scaled to fit the target with its aspect ratio kept, then
+    centered with black padding. Coordinates map from source to target pixels as
+    x / x_factor + pad_left and y / y_factor + pad_top.
+    """
+
+    def __init__(self, source_width, source_height, target_width, target_height):
+        self.source_size = (source_width, source_height)
+        self.target_size = (target_width, target_height)
+
+        aspect_ratio = float(source_width) / source_height
+        target_aspect_ratio = float(target_width) / target_height
+
+        if aspect_ratio > target_aspect_ratio:  # wider than target, pad top and bottom
+            scaled_width = target_width
+            scaled_height = int(round(scaled_width / aspect_ratio))
+        elif aspect_ratio < target_aspect_ratio:  # taller than target, pad left and right
+            scaled_height = target_height
+            scaled_width = int(round(scaled_height * aspect_ratio))
+        else:
+            scaled_width, scaled_height = target_width, target_height
+        self.scaled_size = (scaled_width, scaled_height)
+
+        pad_vert = (target_height - scaled_height) / 2.
+        pad_horz = (target_width - scaled_width) / 2.
+        self.pad_top, self.pad_bot = int(np.floor(pad_vert)), int(np.ceil(pad_vert))
+        self.pad_left, self.pad_right = int(np.floor(pad_horz)), int(np.ceil(pad_horz))
+
+        # factors to scale bounding box values
+        self.x_factor = float(source_width) / scaled_width
+        self.y_factor = float(source_height) / scaled_height
+
+        if source_height > target_height or source_width > target_width:  # shrinking image
+            self.interpolation = cv2.INTER_AREA
+        else:  # stretching image
+            self.interpolation = cv2.INTER_CUBIC
+
+        self._buffers = threading.local()
+
+    def __str__(self):
+        return 'A resize plan from {}x{} to {}x{}'.format(*(self.source_size + self.target_size))
+
+    def window(self, output):
+        """ View of output where the scaled image lands, padding around it. """
+        scaled_width, scaled_height = self.scaled_size
+        return output[self.pad_top:self.pad_top + scaled_height, self.pad_left:self.pad_left + scaled_width]
+
+    def buffer(self, channels=3):
+        """ Zero padded output array reused by every resize of the calling thread. """
+        buffers = self._buffers.__dict__
+        if channels not in buffers:
+            width, height = self.target_size
+            buffers[channels] = np.zeros((height, width, channels), dtype=np.uint8)
+        return buffers[channels]
+
+    def resize(self, image, output=None):
+        """ Letterbox image into output, the thread's reusable buffer by default.
+
+        The default buffer is overwritten by the next call from the same thread,
+        pass an output array, or copy the result, to keep it longer.
+        """
+        if image.shape[1::-1] != self.source_size:
+            raise ValueError('Image of size {}x{} does not match {}'.format(
+                image.shape[1], image.shape[0], self))
+
+        return self._resize_into(image, output, self.interpolation)
+
+    def resize_scaled(self, scaled_image, output=None):
+        """ Letterbox an image already scaled from this plan's source, e.g. another plan's window.
+
+        Used to derive small targets from larger ones instead of the full size source.
+        """
+        scaled_width, scaled_height = self.scaled_size
+        if scaled_image.shape[1] >= scaled_width and scaled_image.shape[0] >= scaled_height:
+            interpolation = cv2.INTER_AREA
+        else:
+            interpolation = cv2.INTER_CUBIC
+        return self._resize_into(scaled_image, output, interpolation)
+
+    def _resize_into(self, image, output, interpolation):
+        channels = image.shape[2] if image.ndim == 3 else 1
+        if output is None:
+            output = self.buffer(channels)
+        window = self.window(output)
+        cv2.resize(image, self.scaled_size, dst=window if image.ndim == 3 else window[:, :, 0],
+                   interpolation=interpolation)
+        return output
+
+    def resize_batch(self, images):
+        """ Letterbox a sequence of same size images into one (N, height, width, channels) array. """
+        width, height = self.target_size
+        channels = images[0].shape[2] if images[0].ndim == 3 else 1
+        outputs = np.zeros((len(images), height, width, channels), dtype=np.uint8)
+        for image, output in zip(images, outputs):
+            self.resize(image, output)
+        return outputs
+
+
+def resize_pyramid(image, target_sizes):
+    """ Letterbox image into every (width, height) of target_sizes, return [(plan, output)] in the same order.
+
+    The first target is resized from image itself. The others, largest first, are
+    resized from the smallest result already computed that still covers them, so
+    each small target reads a few hundred pixels wide image instead of the source.
+    """
+    height, width = image.shape[:2]
+    plans = [resize_plan(width, height, target_width, target_height) for target_width, target_height in target_sizes]
+    results = [None] * len(plans)
+    results[0] = (plans[0], plans[0].resize(image))
+    windows = [plans[0].window(results[0][1])]
+
+    for index in sorted(range(1, len(plans)), key=lambda index: plans[index].scaled_size, reverse=True):
+        plan = plans[index]
+        scaled_width, scaled_height = plan.scaled_size
+        covering = [window for window in windows
+                    if window.shape[1] >= scaled_width and window.shape[0] >= scaled_height]
+
+        if covering:
+            output = plan.resize_scaled(min(covering, key=lambda window: window.shape[0] * window.shape[1]))
+        else:
+            output = plan.resize(image)
+        results[index] = (plan, output)
+        windows.append(plan.window(output))
+
+    return results
+
+
+@lru_cache(maxsize=PLAN_CACHE_SIZE)
+def resize_plan(source_width, source_height, target_width, target_height):
+    """ Shared plan resizing source_width x source_height images to target_width x target_height. """
+    return ResizePlan(source_width, source_height, target_width, target_height)
@@ -0,0 +1,23 @@
+import os
+from collections import namedtuple
+
+# kept free of image backends, the parser imports it before any image is processed
+SKIPPED_LABEL = 'Skip'
+
+LabeledImageSummary = namedtuple(
+    'LabeledImageSummary',
+    ['labelbox_id', 'file_name', 'image_path', 'label_names', 'boxes', 'label_hash', 'source_url',
+     'target_size', 'extra_sizes', 'rendered', 'x_factor', 'y_factor', 'pad_top', 'pad_left', 'augmentation',
+     'variants', 'outputs', 'timings'])
+
+
+def split_file_name(source_img_url):
+    """ Extract file name and extension from source image url. """
+    file_name = source_img_url.rsplit('/', 1)[-1].split('.')[0]
+    file_ext = '.' + source_img_url.split("/")[-1].split('.')[1]
+    return file_name, file_ext
+
+
+def image_file_path(images_dir, source_img_url):
+    """ Generate path where the source image is stored once downloaded. """
+    return os.path.join(images_dir, ''.join(split_file_name(source_img_url)))
@@ -0,0 +1,58 @@
+import os
+
+from utils.sync import write_atomic
+
+
+class LabelMapAccumulator:
+    """ Collect label names as each image completes and write label_map.pbtxt once done. """
+
+    def __init__(self, file_path):
+        self._file_path = file_path
+        self._label_names = set()
+
+    def update(self, label_names):
+        self._label_names.update(label_names)
+
+    @property
+    def label_names(self):
+        """ Label names ordered by id; sorted so ids do not depend on hash seed or scheduling. """
+        return tuple(sorted(self._label_names))
+
+    def write(self):
+        data = []
+        for index, label_name in enumerate(self.label_names):
+            first_line = 'item {\n'
+            second_line = '  id: {}\n'.format(index + 1)
+            third_line = '  name: \'{}\'\n'.format(label_name)
+            fourth_line = '}\n'
+
+            data.append(first_line + second_line + third_line + fourth_line)
+
+        write_atomic(self._file_path, ''.join(data).encode('utf-8'))
+
+
+class FileMapWriter:
+    """ Stream trainval.txt one line per completed image.
+
+    Lines go to a temporary file that replaces the real one only when the run
+    completes, so an interrupted run never leaves a truncated file map behind.
+    """
+
+    def __init__(self, file_path):
+        self._file_path = file_path
+        self._tmp_file_path = file_path + '.tmp'
+        self._file = None
+
+    def __enter__(self):
+        self._file = open(self._tmp_file_path, 'w')
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._file.close()
+        if exc_type is None:
+            os.replace(self._tmp_file_path, self._file_path)
+        else:
+            os.remove(self._tmp_file_path)
+
+    def add(self, file_name):
+        self._file.write('{}\n'.format(file_name))
@@ -0,0 +1,132 @@
+import asyncio
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+
+from extractor.core.data.downloader import ImageDownloader
+
+from .json_parser import JSONParser, process_labeled_image
+
+# marks the end of the entry stream in the pipeline queue
+_END = object()
+
+
+class AsyncJSONParser(JSONParser):
+    """ JSONParser running its stages concurrently on an asyncio event loop.
+
+    Construction only stores the configuration, awaiting run() parses the file:
+
+        entries  -- read from the json file and matched against the manifest on a dedicated thread.
+        download -- one coroutine per entry, fetches run on download_workers threads.
+        process  -- decode, resize and annotate on workers processes (one thread when workers is 1).
+        collect  -- label map, trainval, manifest and TFRecords written from a dedicated thread.
+
+    Entries travel through a bounded queue as tasks chaining their download and
+    processing, so at most queue_size entries are in flight and a slow stage
+    holds the producer back. Tasks are collected in queue order, which keeps the
+    dataset identical to the one JSONParser writes.
+    """
+
+    def __init__(self, logger, *args, **kwargs):
+        self._configure(logger, kwargs)
+        self._logger = logger(__name__)
+        self._logger_factory = logger
+        self._queue_size = kwargs.get('queue_size') or 2 * max(self._download_workers, self._workers)
+
+    def __str__(self):
+        return 'An asyncio json parser for file {}'.format(self._json_file)
+
+    async def run(self):
+        self._logger.info('Parsing extracted data to generate custom object.')
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue(maxsize=self._queue_size)
+        # task taken from the queue but not collected yet
+        self._head = None
+        downloader = ImageDownloader(self._logger_factory, workers=self._download_workers, metrics=self._metrics,
+                                     cache=self._image_cache, revalidate=self._cache_revalidate)
+
+        if self._workers > 1:
+            self._logger.info('Processing images over %d worker processes.', self._workers)
+            process_executor = ProcessPoolExecutor(max_workers=self._workers)
+        else:
+            process_executor = ThreadPoolExecutor(max_workers=1)
+
+        with ThreadPoolExecutor(max_workers=self._download_workers) as download_executor, \
+                ThreadPoolExecutor(max_workers=1) as entries_executor, \
+                ThreadPoolExecutor(max_workers=1) as collect_executor, process_executor:
+            producer = asyncio.ensure_future(
+                self._produce(queue, downloader, entries_executor, download_executor, process_executor))
+            try:
+                await loop.run_in_executor(
+                    collect_executor, self._collect_summaries, self._logger_factory, self._summaries(queue, loop))
+                # surface a producer failure which ended the stream early
+                await producer
+            finally:
+                producer.cancel()
+                tasks = [self._head]
+                while not queue.empty():
+                    tasks.append(queue.get_nowait())
+                for task in tasks:
+                    if task is not None and task is not _END:
+                        task.cancel()
+
+    async def _produce(self, queue, downloader, entries_executor, download_executor, process_executor):
+        """ Queue one task per entry, waiting while the queue is full.
+
+        Entries are pulled one at a time on entries_executor, so json decoding,
+        manifest lookups and output checks never block the event loop thread.
+        """
+        loop = asyncio.get_running_loop()
+        jobs = self._download_jobs()
+        try:
+            while True:
+                job = await loop.run_in_executor(entries_executor, next, jobs, _END)
+                if job is _END:
+                    break
+                entry, url = job
+                if isinstance(entry, Future):
+                    task = asyncio.wrap_future(entry)
+                else:
+                    task = asyncio.ensure_future(
+                        self._download_and_process(entry, url, downloader, download_executor, process_executor))
+                await queue.put(task)
+        finally:
+            await queue.put(_END)
+
+    async def _download_and_process(self, entry, url, downloader, download_executor, process_executor):
+        """ Summary of one entry, None when its image could not be downloaded. """
+        loop = asyncio.get_running_loop()
+        image_content = None
+        if url is not None:
+            image_content = await loop.run_in_executor(download_executor, downloader.fetch, url)
+            if image_content is None:
+                return None
+
+        job = (self._logger_factory, image_content, entry)
+        return await loop.run_in_executor(process_executor, process_labeled_image, job)
+
+    async def _next_summaries(self, queue):
+        """ Wait for the next summary, then take every following one already done. """
+        summaries = []
+        while True:
+            if self._head is None:
+                if summaries and queue.empty():
+                    return summaries
+                self._head = await queue.get()
+
+            if self._head is _END:
+                summaries.append(_END)
+                return summaries
+            if summaries and not self._head.done():
+                return summaries
+
+            summary = await self._head
+            self._head = None
+            if summary is not None:
+                summaries.append(summary)
+
+    def _summaries(self, queue, loop):
+        """ Iterate summaries from the collect thread, in queue order. """
+        while True:
+            for summary in asyncio.run_coroutine_threadsafe(self._next_summaries(queue), loop).result():
+                if summary is _END:
+                    return
+                yield summary
@@ -1,14 +1,36 @@
 import json
 import os
+import shutil
+from concurrent.futures import Future, ProcessPoolExecutor
+from contextlib import nullcontext
+from functools import partial
 
-#from shapely import wkt
-from extractor.core.data.labelbox import LabeledImagePascalVOC
+from extractor.core.data.downloader import ImageDownloader
+from extractor.core.data.local_source import LocalSource
+from extractor.core.data.summary import SKIPPED_LABEL, LabeledImageSummary, image_file_path
+from extractor.core.parser.accumulator import FileMapWriter, LabelMapAccumulator
+from extractor.core.parser.json_stream import iter_json_entries
+from extractor.core.parser.split import DatasetSplitter
+from utils.concurrency import completed_future, imap_bounded
+from utils.logger import ProgressLogger
+from utils.metrics import RunMetrics
+from utils.sync import file_digest
+
+
+def process_labeled_image(job):
+    """ Process one image, loading the image backends on first use in the calling process. """
+    from extractor.core.data.labelbox import process_labeled_image
+    return process_labeled_image(job)
 
 
 class JSONParser:
     """ Custom json parsing utility to handle labelbox.io extraction file. """
 
     def __init__(self, logger, *args, **kwargs):
+        self._configure(logger, kwargs)
+        self.parse_extracted_data_to_object(logger)
+
+    def _configure(self, logger, kwargs):
         self._logger = logger(__name__)
         self._json_file = kwargs['json_file']
         self._images_dir = kwargs['images_dir']
@@ -17,75 +39,223 @@ class JSONParser:
         self._annotations_dir = kwargs['annotations_dir']
         self._required_img_width = kwargs['required_img_width']
         self._required_img_height = kwargs['required_img_height']
-
-        self._extract_json_from_file()
-        self.parse_extracted_data_to_object(logger)
+        self._download_workers = kwargs.get('download_workers', 8)
+        self._workers = kwargs.get('workers', 1)
+        self._render = kwargs.get('render', False)
+        self._manifest = kwargs['manifest']
+        self._tfrecord = kwargs.get('tfrecord', False)
+        self._tfrecord_shard_size = kwargs.get('tfrecord_shard_size', 1000)
+        self._split_ratios = kwargs.get('split_ratios')
+        self._split_shards = kwargs.get('split_shards', 1)
+        self._split_seed = kwargs.get('split_seed', 0)
+        self._augmentation = kwargs.get('augmentation')
+        self._metrics = kwargs.get('metrics') or RunMetrics()
+        self._local_source = kwargs.get('local_source') or LocalSource()
+        self._local_link_mode = kwargs.get('local_link_mode', 'symlink')
+        self._image_cache = kwargs.get('image_cache')
+        self._extra_resolutions = kwargs.get('extra_resolutions', ())
+        self._cache_revalidate = kwargs.get('cache_revalidate', False)
+        self.tfrecord_digests = {}
 
     def __str__(self):
         return 'A json parser for file {}'.format(self._json_file)
 
     def _extract_json_from_file(self):
-        """ Read file and extract contained json data. """
+        """ Stream label entries one at a time from a json or json lines file. """
         self._logger.info("Opening json file and reading contained data.")
         with open(self._json_file, 'r') as data_file:
-            data = data_file.read()
-            self._json_data = json.loads(data)
+            for entry in iter_json_entries(data_file):
+                yield entry
 
         self._logger.info(
             "Extracting data from json file completed with success.")
 
     def parse_extracted_data_to_object(self, logger):
         self._logger.info('Parsing extracted data to generate custom object.')
-        labeled_imgs = []
+        downloader = ImageDownloader(logger, workers=self._download_workers, metrics=self._metrics,
+                                     cache=self._image_cache, revalidate=self._cache_revalidate)
+        downloads = downloader.download(self._download_jobs())
+        # entries up to date in the manifest travel as completed futures and skip processing
+        jobs = (entry if isinstance(entry, Future) else (logger, image_content, entry)
+                for entry, image_content in downloads)
+        self._collect_summaries(logger, self._process_labeled_images(jobs))
 
-        for entry in self._json_data:
-            entry['Images Dir'] = self._images_dir
-            entry['Annotations Dir'] = self._annotations_dir
-            entry['Required Image Width'] = self._required_img_width
-            entry['Required Image Height'] = self._required_img_height
-            entry['Resized Image Dir'] = self._resized_dir
+    def _collect_summaries(self, logger, summaries):
+        """ Write label map, trainval, annotation store, manifest and TFRecords from summaries in dataset order. """
+        # numpy only loads once the dataset is being collected
+        from extractor.core.data.generator.annotation_store import STORE_DIR_NAME, AnnotationStoreWriter
+
+        label_map = LabelMapAccumulator(os.path.join(self._output_dir, 'label_map.pbtxt'))
+        annotation_store = AnnotationStoreWriter(os.path.join(self._annotations_dir, STORE_DIR_NAME))
+        labelbox_ids = set()
+        tfrecord_writer = None
+        if self._tfrecord:
+            from extractor.core.data.generator.tfrecord_writer import ShardedTFRecordWriter
 
-            image = LabeledImagePascalVOC(logger, **entry)
-            labeled_imgs.append(image)
+            tfrecord_writer = ShardedTFRecordWriter(
+                os.path.join(self._output_dir, 'tfrecord'), shard_size=self._tfrecord_shard_size)
 
-        self._generate_label_map(labeled_imgs)
-        self._generate_file_map(labeled_imgs)
+        splitter = None
+        if self._split_ratios:
+            splitter = DatasetSplitter(
+                self._output_dir, ratios=self._split_ratios, shards=self._split_shards, seed=self._split_seed)
 
-    def _generate_file_map(self, labeled_images):
-        file_path = os.path.join(self._output_dir, 'trainval.txt')
+        progress = ProgressLogger(self._logger)
+        try:
+            with FileMapWriter(os.path.join(self._output_dir, 'trainval.txt')) as file_map, \
+                    splitter or nullcontext():
+                for summary in summaries:
+                    self._metrics.increment('images')
+                    self._metrics.add_timings(summary.timings)
+                    with self._metrics.stage('label_map'):
+                        label_map.update(summary.label_names)
+                        file_map.add(summary.file_name)
+                        annotation_store.add(summary)
+                        for file_name, boxes in summary.variants:
+                            file_map.add(file_name)
+                            annotation_store.add_image(file_name, boxes, summary.x_factor, summary.y_factor,
+                                                       summary.pad_top, summary.pad_left)
+                        self._metrics.increment('augmented_images', len(summary.variants))
+                    if splitter is not None:
+                        with self._metrics.stage('split'):
+                            splitter.add(summary.file_name, summary.boxes,
+                                         variants=[file_name for file_name, _ in summary.variants])
+                    labelbox_ids.add(summary.labelbox_id)
+                    self._manifest.record(summary.labelbox_id, summary._asdict())
+                    if tfrecord_writer is not None:
+                        with self._metrics.stage('tfrecord'):
+                            self._generate_tfrecord_example(logger, summary, tfrecord_writer)
+                    progress.update()
 
-        file_names = []
-        for label in labeled_images:
-            file_names.append(label._file_name)
+            self._manifest.retain(labelbox_ids)
+            if tfrecord_writer is not None:
+                with self._metrics.stage('tfrecord'):
+                    tfrecord_writer.close()
+                self.tfrecord_digests = tfrecord_writer.shard_digests
+                self._metrics.increment('tfrecord_shards_reused', tfrecord_writer.reused_shards)
+        finally:
+            self._manifest.save()
 
-        with open(file_path, 'w') as file_:
-            for file_name in file_names:
-                file_.write("{}\n".format(file_name))
+        with self._metrics.stage('label_map'):
+            label_map.write()
+            annotation_store.write(label_map.label_names)
+            self._copy_dataset_files_to_extra_resolutions(splitter)
+        if splitter is not None:
+            for split_name, label_counts in splitter.label_counts().items():
+                self._logger.info('%s split: %s', split_name, ', '.join(
+                    '{} {}'.format(label, count) for label, count in sorted(label_counts.items())))
+        progress.finish()
+        self._logger.info('%d images in dataset, %d unchanged since last run.', len(labelbox_ids), self._skipped)
 
-    def _generate_label_map(self, labeled_images):
+    def _copy_dataset_files_to_extra_resolutions(self, splitter=None):
+        """ Label map, trainval and splits do not depend on the resolution, every resolution gets the same files. """
+        for resolution in self._extra_resolutions:
+            for file_name in ('label_map.pbtxt', 'trainval.txt'):
+                shutil.copyfile(os.path.join(self._output_dir, file_name),
+                                os.path.join(resolution['output_dir'], file_name))
+            if splitter is not None:
+                splits_dir = os.path.join(resolution['output_dir'], os.path.basename(splitter.splits_dir))
+                # rebuilt from scratch, lists of previous runs must not linger next to these
+                if os.path.exists(splits_dir):
+                    shutil.rmtree(splits_dir)
+                os.makedirs(splits_dir)
+                for file_name in splitter.file_names:
+                    shutil.copyfile(os.path.join(splitter.splits_dir, file_name), os.path.join(splits_dir, file_name))
 
-        label_names = set()
-        for label in labeled_images:
-            label_names.update(label.label_names)
+    def _generate_tfrecord_example(self, logger, summary, tfrecord_writer):
+        """ Queue the resized image, then its augmented variants, and their boxes for the TFRecord shards.
 
-        label_names = tuple(label_names)
+        Records are keyed by the digest of their image and their boxes, images are
+        only read back when their shard changed since the last run.
+        """
+        resized_dir, file_ext = os.path.dirname(summary.image_path), os.path.splitext(summary.image_path)[1]
+        examples = [(summary.image_path, summary.boxes)]
+        examples.extend((os.path.join(resized_dir, file_name + file_ext), boxes)
+                        for file_name, boxes in summary.variants)
 
-        data = []
-        first_line = 'item {\n'
-        second_line = '  id: {}\n'
-        third_line = '  name: \'{}\'\n'
-        fourth_line = '}'
+        for image_path, boxes in examples:
+            image_digest = summary.outputs.get(image_path) or file_digest(image_path)
+            key = json.dumps([summary.labelbox_id, os.path.basename(image_path), image_digest,
+                              list(summary.target_size), [list(box) for box in boxes]])
+            tfrecord_writer.add(key, partial(self._build_tfrecord_example, logger, summary, image_path, boxes))
 
-        for index, label_name in enumerate(label_names):
-            first_line = 'item {\n'
-            second_line = '  id: {}\n'.format(index + 1)
-            third_line = '  name: \'{}\'\n'.format(label_name)
-            fourth_line = '}\n'
+    @staticmethod
+    def _build_tfrecord_example(logger, summary, image_path, boxes):
+        from extractor.core.data.generator.tfrecord import TFRecordGenerator
 
-            temp = first_line + second_line + third_line + fourth_line
-            data.append(temp)
+        with open(image_path, 'rb') as image_file:
+            image_content = image_file.read()
+
+        config = {
+            'labelbox_id': summary.labelbox_id,
+            'image_path': image_path,
+            'image_content': image_content,
+            'image_width': summary.target_size[0],
+            'image_height': summary.target_size[1],
+            'bounding_boxes': boxes,
+        }
+        return TFRecordGenerator(logger, config).record
+
+    def _process_labeled_images(self, jobs):
+        """ Yield image summaries in input order, over worker processes when configured. """
+        if self._workers > 1:
+            self._logger.info('Processing images over %d worker processes.', self._workers)
+            with ProcessPoolExecutor(max_workers=self._workers) as executor:
+                yield from imap_bounded(
+                    executor, process_labeled_image, jobs, window=self._workers * 2)
+        else:
+            for job in jobs:
+                if isinstance(job, Future):
+                    yield job.result()
+                else:
+                    yield process_labeled_image(job)
+
+    def _download_jobs(self):
+        """ Complete each entry with extraction config and pair it with the url to fetch. """
+        target_size = (self._required_img_width, self._required_img_height)
+        extra_sizes = tuple(tuple(resolution['size']) for resolution in self._extra_resolutions)
+        extra_resolutions = [{
+            'Size': tuple(resolution['size']),
+            'Resized Image Dir': resolution['resize_dir'],
+            'Annotations Dir': resolution['annotations_dir'],
+        } for resolution in self._extra_resolutions]
+        self._skipped = 0
+
+        for entry in self._extract_json_from_file():
+            if entry['Label'] == SKIPPED_LABEL:
+                self._metrics.increment('skipped_labels')
+
+            record = self._manifest.lookup(entry, target_size, render=self._render, extra_sizes=extra_sizes,
+                                           augmentation=self._augmentation)
+            if record is not None:
+                self._skipped += 1
+                self._metrics.increment('unchanged')
+                yield completed_future(LabeledImageSummary(**record)), None
+                continue
+
+            entry['Images Dir'] = self._images_dir
+            entry['Annotations Dir'] = self._annotations_dir
+            entry['Required Image Width'] = self._required_img_width
+            entry['Required Image Height'] = self._required_img_height
+            entry['Resized Image Dir'] = self._resized_dir
+            entry['Render Debug'] = self._render
+            entry['Extra Resolutions'] = extra_resolutions
+            entry['Augmentation'] = self._augmentation
 
-        file_path = os.path.join(self._output_dir, 'label_map.pbtxt')
+            local_image_path = self._local_source.resolve(entry['Labeled Data'])
+            if local_image_path is not None:
+                if os.path.isfile(local_image_path):
+                    self._metrics.increment('local_sources')
+                    entry['Local Image Path'] = local_image_path
+                    entry['Local Link Mode'] = self._local_link_mode
+                    yield entry, None
+                    continue
+                self._logger.warning('WARN: Local image %s not found, downloading %s instead',
+                                     local_image_path, entry['Labeled Data'])
 
-        with open(file_path, 'w') as label_file:
-            label_file.writelines(data)
+            image_path = image_file_path(self._images_dir, entry['Labeled Data'])
+            if os.path.exists(image_path) and not self._manifest.source_url_changed(entry):
+                self._metrics.increment('images_on_disk')
+                yield entry, None
+            else:
+                yield entry, entry['Labeled Data']
@@ -0,0 +1,139 @@
+import io
+import json
+
+CHUNK_SIZE = 1 << 16
+WHITESPACE = ' \t\n\r'
+
+
+def _byte_length(text):
+    return len(text) if text.isascii() else len(text.encode('utf-8'))
+
+
+def _read_first_char(json_file):
+    """ First non whitespace character of json_file and the number of characters read to find it. """
+    read = 0
+    while True:
+        char = json_file.read(1)
+        if not char or char not in WHITESPACE:
+            return char, read + len(char)
+        read += 1
+
+
+def iter_json_entries(json_file, chunk_size=CHUNK_SIZE, offsets=False):
+    """ Yield entries from a labelbox.io export, either a json array or json lines.
+
+    With offsets, (offset, entry) pairs are yielded instead, offset being the
+    byte at which the entry starts; json_file must then be opened with
+    encoding='utf-8' and newline=''. iter_json_entries_from resumes there.
+    """
+    first_char, read = _read_first_char(json_file)
+    if not first_char:
+        return
+
+    if first_char == '[':
+        yield from iter_json_array(json_file, chunk_size=chunk_size, offset=read if offsets else None)
+    else:
+        offset = read - 1
+        first_line = first_char + json_file.readline()
+        if first_line.strip():
+            entry = json.loads(first_line)
+            yield (offset, entry) if offsets else entry
+        yield from iter_json_lines(json_file, offset=offset + _byte_length(first_line) if offsets else None)
+
+
+def iter_json_entries_from(json_file, offset, chunk_size=CHUNK_SIZE):
+    """ Yield the entries of an export from the byte offset of one of them, json_file being opened in binary mode. """
+    first_byte = b' '
+    while first_byte and first_byte in WHITESPACE.encode('ascii'):
+        first_byte = json_file.read(1)
+    json_file.seek(offset)
+    text_file = io.TextIOWrapper(json_file, encoding='utf-8', newline='')
+
+    if first_byte == b'[':
+        yield from iter_json_array(text_file, chunk_size=chunk_size)
+    else:
+        yield from iter_json_lines(text_file)
+
+
+def iter_json_lines(json_file, offset=None):
+    """ Yield one entry per non empty line of a json lines file, with offset (offset, entry) pairs. """
+    for line in json_file:
+        if line.strip():
+            entry = json.loads(line)
+            yield (offset, entry) if offset is not None else entry
+        if offset is not None:
+            offset += _byte_length(line)
+
+
+def iter_json_array(json_file, chunk_size=CHUNK_SIZE, offset=None):
+    """ Yield items of a top level json array one at a time.
+
+    The opening bracket must already have been consumed from json_file. Only the
+    item being decoded is kept in memory, the buffer is refilled chunk by chunk
+    and grows only while a single item is larger than it.
+
+    With offset, the byte offset json_file is read from, (offset, item) pairs
+    are yielded instead, offset being the byte at which the item starts.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ''
+    position = 0
+    # buffer position up to which offset is counted
+    counted = 0
+    read_size = chunk_size
+    eof = False
+    expect_separator = False
+
+    while True:
+        while position < len(buffer) and buffer[position] in WHITESPACE:
+            position += 1
+
+        if position == len(buffer):
+            if eof:
+                raise ValueError('Unexpected end of file while reading json array.')
+            if offset is not None:
+                offset += _byte_length(buffer[counted:])
+                counted = 0
+            buffer = json_file.read(read_size)
+            position = 0
+            eof = not buffer
+            continue
+
+        char = buffer[position]
+        if char == ']':
+            return
+        if expect_separator:
+            if char != ',':
+                raise ValueError('Expected "," or "]" in json array, found {!r}.'.format(char))
+            position += 1
+            expect_separator = False
+            continue
+
+        try:
+            entry, end = decoder.raw_decode(buffer, position)
+        except ValueError:
+            if eof:
+                raise
+            end = None
+
+        # item may be truncated (or, for scalars, only partially read): fetch more
+        if end is None or (end == len(buffer) and not eof):
+            chunk = json_file.read(read_size)
+            eof = not chunk
+            if offset is not None:
+                offset += _byte_length(buffer[counted:position])
+                counted = 0
+            buffer = buffer[position:] + chunk
+            position = 0
+            read_size *= 2
+            continue
+
+        if offset is not None:
+            offset += _byte_length(buffer[counted:position])
+            counted = position
+            yield offset, entry
+        else:
+            yield entry
+        position = end
+        read_size = chunk_size
+        expect_separator = True
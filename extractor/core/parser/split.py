@@ -0,0 +1,146 @@
+import os
+import random
+from collections import Counter
+from contextlib import ExitStack
+
+from .accumulator import FileMapWriter
+
+SPLIT_NAMES = ('train', 'val', 'test')
+SPLITS_DIR_NAME = 'splits'
+
+
+class _BalancedAssigner:
+    """ Assign items one at a time to buckets with target shares of every label.
+
+    Each bucket keeps per label box counts. An item goes to the bucket the
+    furthest behind its share of the item's labels (and of the item count, so
+    buckets keep their size even for unlabeled images); ties are broken by a
+    seeded draw. Every item costs O(labels x buckets), whatever the dataset size.
+    """
+
+    def __init__(self, ratios, seed):
+        total = float(sum(ratios))
+        self._ratios = [ratio / total for ratio in ratios]
+        self._random = random.Random(seed)
+        self._seen = Counter()
+        self._counts = [Counter() for _ in ratios]
+        self._items = 0
+        self._bucket_items = [0] * len(ratios)
+
+    @property
+    def counts(self):
+        return self._counts
+
+    def assign(self, label_counts):
+        self._items += 1
+        self._seen.update(label_counts)
+
+        best_bucket = None
+        best_key = None
+        for bucket, ratio in enumerate(self._ratios):
+            if not ratio:
+                continue
+            counts = self._counts[bucket]
+            deficit = ratio * self._items - self._bucket_items[bucket]
+            for label, count in label_counts.items():
+                deficit += count * (ratio * self._seen[label] - counts[label]) / self._seen[label]
+            key = (deficit, self._random.random())
+            if best_key is None or key > best_key:
+                best_bucket, best_key = bucket, key
+
+        self._bucket_items[best_bucket] += 1
+        self._counts[best_bucket].update(label_counts)
+        return best_bucket
+
+
+class DatasetSplitter:
+    """ Stream images into stratified train/val/test lists and K label balanced train shards.
+
+    Each image is placed as soon as it completes, from the labels of its boxes,
+    so the split costs a single pass over the dataset and keeps only per label
+    counters in memory. With the same seed and dataset order, the lists are the same.
+
+    Files written to output_dir/splits, any other file found there is removed:
+        train.txt, val.txt, test.txt               -- one file name per line, like trainval.txt.
+        train-00000-of-0000K.txt ...               -- the train list cut in K shards, when shards > 1.
+    """
+
+    def __init__(self, output_dir, ratios=(0.8, 0.1, 0.1), shards=1, seed=0):
+        if len(ratios) != len(SPLIT_NAMES) or min(ratios) < 0 or not sum(ratios):
+            raise ValueError('Split ratios must be three non negative numbers, got {}'.format(ratios))
+        if shards < 1:
+            raise ValueError('Shard count must be at least 1, got {}'.format(shards))
+
+        self._splits_dir = os.path.join(output_dir, SPLITS_DIR_NAME)
+        self._shards = shards
+        self._split_assigner = _BalancedAssigner(ratios, seed)
+        # a distinct stream, so changing the shard count leaves the split untouched
+        self._shard_assigner = _BalancedAssigner([1] * shards, '{}-shards'.format(seed))
+        self._stack = None
+        self._split_files = []
+        self._shard_files = []
+
+    def __enter__(self):
+        os.makedirs(self._splits_dir, exist_ok=True)
+        self._stack = ExitStack()
+        try:
+            self._split_files = [
+                self._stack.enter_context(FileMapWriter(os.path.join(self._splits_dir, name + '.txt')))
+                for name in SPLIT_NAMES]
+            if self._shards > 1:
+                self._shard_files = [
+                    self._stack.enter_context(FileMapWriter(os.path.join(self._splits_dir, self.shard_name(shard))))
+                    for shard in range(self._shards)]
+        except BaseException:
+            self._stack.close()
+            raise
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        suppressed = self._stack.__exit__(exc_type, exc_value, traceback)
+        if exc_type is None:
+            self._remove_stale_files()
+        return suppressed
+
+    def _remove_stale_files(self):
+        """ Remove lists of previous runs, e.g. shards of another shard count, which would overlap these. """
+        file_names = set(self.file_names)
+        for entry in os.scandir(self._splits_dir):
+            if entry.name not in file_names and entry.is_file():
+                os.remove(entry.path)
+
+    def shard_name(self, shard):
+        return 'train-{:05d}-of-{:05d}.txt'.format(shard, self._shards)
+
+    @property
+    def file_names(self):
+        """ Names of the files written in the splits folder. """
+        names = [name + '.txt' for name in SPLIT_NAMES]
+        if self._shards > 1:
+            names.extend(self.shard_name(shard) for shard in range(self._shards))
+        return names
+
+    @property
+    def splits_dir(self):
+        return self._splits_dir
+
+    def add(self, file_name, boxes, variants=()):
+        """ Place one image, boxes being (label, xmin, ymin, xmax, ymax) tuples.
+
+        Augmented variants follow their image, so none ends up in another split than its original.
+        """
+        label_counts = Counter(box[0] for box in boxes)
+        split = self._split_assigner.assign(label_counts)
+        files = [self._split_files[split]]
+
+        if split == 0 and self._shards > 1:
+            files.append(self._shard_files[self._shard_assigner.assign(label_counts)])
+
+        for file_map in files:
+            file_map.add(file_name)
+            for variant in variants:
+                file_map.add(variant)
+
+    def label_counts(self):
+        """ Box count of every label per split name. """
+        return {name: dict(counts) for name, counts in zip(SPLIT_NAMES, self._split_assigner.counts)}
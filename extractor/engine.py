@@ -0,0 +1,43 @@
+import asyncio
+
+from .core.data.manifest import ExtractionManifest
+from .core.parser.async_parser import AsyncJSONParser
+from .extractor import Extractor
+
+
+class ExtractionEngine(Extractor):
+    """ Labelbox.io label object extractor driven by an asyncio event loop.
+
+    Takes the same arguments as Extractor, plus queue_size bounding the entries
+    in flight, but does nothing until run() is awaited:
+
+        engine = ExtractionEngine(logger=create_logger, json_file=..., output_dir=..., ...)
+        await engine.run()
+
+    Downloads, image processing and dataset writes overlap instead of running one
+    after the other, and blocking work never runs on the event loop thread, so the
+    engine can share a loop with other async tooling.
+    """
+
+    def __init__(self, logger, *args, **kwargs):
+        self._configure(logger, kwargs)
+        self._logger_factory = logger
+        self._queue_size = kwargs.get('queue_size')
+
+    def __str__(self):
+        return 'An asyncio labebox.io object extractor with output path {}'.format(self._output_dir)
+
+    async def run(self):
+        """ Extract the dataset and sync it to deep_detection, return the run report. """
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self._prepare_output_path)
+        self._manifest = await loop.run_in_executor(None, ExtractionManifest, self._logger_factory, self._output_dir)
+
+        json_parser = AsyncJSONParser(self._logger_factory, queue_size=self._queue_size, **self._parser_config())
+        await json_parser.run()
+        self._tfrecord_digests = json_parser.tfrecord_digests
+
+        await loop.run_in_executor(None, self._copy_to_deep_detection)
+        await loop.run_in_executor(None, self._manifest.save)
+        await loop.run_in_executor(None, self._write_report)
+        return self.metrics.report()
@@ -1,25 +1,75 @@
 import os
 import shutil
-from glob import glob
 
+from utils.metrics import RunMetrics
+from utils.sync import DirectorySync
+
+from .core.data.augment import DEFAULT_OPERATIONS
+from .core.data.image_cache import ImageCache
+from .core.data.local_source import LocalSource
+from .core.data.manifest import ExtractionManifest
 from .core.parser.json_parser import JSONParser
+from .core.parser.split import SPLITS_DIR_NAME
 
 
 class Extractor:
     """ Labelbox.io label object extractor. """
 
     def __init__(self, logger, *args, **kwargs):
+        self._configure(logger, kwargs)
+
+        self._prepare_output_path()
+        self._manifest = ExtractionManifest(logger, self._output_dir)
+        self._extract_labels_from_json(logger)
+        self._copy_to_deep_detection()
+        self._manifest.save()
+        self._write_report()
+
+    def _configure(self, logger, kwargs):
         self._logger = logger(__name__)
         self._json_file = kwargs['json_file']
         self._output_dir = kwargs['output_dir']
         self._detection_dir = kwargs['detection_dir']
         self._required_img_width = kwargs['required_img_width']
         self._required_img_height = kwargs['required_img_height']
-
-        self._prepare_output_path()
-        self._extract_labels_from_json(logger)
-        self._copy_annotation_to_deep_detection()
-        self._copy_resized_images_to_deep_detection()
+        self._download_workers = kwargs.get('download_workers', 8)
+        self._workers = kwargs.get('workers', 1)
+        self._render = kwargs.get('render', False)
+        self._tfrecord = kwargs.get('tfrecord', False)
+        self._tfrecord_shard_size = kwargs.get('tfrecord_shard_size', 1000)
+        self._split_ratios = kwargs.get('split_ratios')
+        self._split_shards = kwargs.get('split_shards', 1)
+        self._split_seed = kwargs.get('split_seed', 0)
+        # sharding cuts the train list, so it implies the default split
+        if self._split_shards > 1 and not self._split_ratios:
+            self._split_ratios = (0.8, 0.1, 0.1)
+        self._augmentation = None
+        if kwargs.get('augment_variants'):
+            self._augmentation = {
+                'variants': kwargs['augment_variants'],
+                'operations': list(kwargs.get('augment_operations') or DEFAULT_OPERATIONS),
+                'seed': kwargs.get('augment_seed', 0),
+            }
+        self._directory_sync = DirectorySync(
+            logger,
+            mode=kwargs.get('sync_mode', 'auto'),
+            compare=kwargs.get('sync_compare', 'digest'),
+            workers=kwargs.get('sync_workers', 4))
+        self.metrics = kwargs.get('metrics') or RunMetrics()
+        self._local_source = kwargs.get('local_source') or LocalSource()
+        self._local_link_mode = kwargs.get('local_link_mode', 'symlink')
+        self._image_cache = None
+        if kwargs.get('cache_dir'):
+            self._image_cache = ImageCache(kwargs['cache_dir'], max_bytes=kwargs.get('cache_size', 10 << 30))
+        self._cache_revalidate = kwargs.get('cache_revalidate', False)
+        self._report_file = kwargs.get('report_file') or os.path.join(self._output_dir, 'run_report.json')
+
+        # every extra resolution gets its own folder with the same layout as output_dir
+        main_size = (self._required_img_width, self._required_img_height)
+        self._extra_target_sizes = []
+        for size in kwargs.get('extra_target_sizes', ()):
+            if tuple(size) != main_size and tuple(size) not in self._extra_target_sizes:
+                self._extra_target_sizes.append(tuple(size))
 
     def __str__(self):
         return 'An labebox.io object extractor with output path {}'.format(self._output_dir)
@@ -47,9 +97,21 @@ class Extractor:
         if not os.path.exists(self._resized_dir):
             os.makedirs(self._resized_dir)
 
-    def _extract_labels_from_json(self, logger):
-
-        config = {
+        self._extra_resolutions = []
+        for width, height in self._extra_target_sizes:
+            output_dir = os.path.join(self._output_dir, '{}x{}'.format(width, height))
+            resolution = {
+                'size': (width, height),
+                'output_dir': output_dir,
+                'resize_dir': os.path.join(output_dir, 'resized'),
+                'annotations_dir': os.path.join(output_dir, 'annotations'),
+            }
+            for directory in (resolution['resize_dir'], resolution['annotations_dir']):
+                os.makedirs(directory, exist_ok=True)
+            self._extra_resolutions.append(resolution)
+
+    def _parser_config(self):
+        return {
             'json_file': self._json_file,
             'images_dir': self._image_dir,
             'output_dir': self._output_dir,
@@ -57,19 +119,65 @@ class Extractor:
             'annotations_dir': self._annotation_dir,
             'required_img_width': self._required_img_width,
             'required_img_height': self._required_img_height,
+            'download_workers': self._download_workers,
+            'workers': self._workers,
+            'render': self._render,
+            'manifest': self._manifest,
+            'tfrecord': self._tfrecord,
+            'tfrecord_shard_size': self._tfrecord_shard_size,
+            'split_ratios': self._split_ratios,
+            'split_shards': self._split_shards,
+            'split_seed': self._split_seed,
+            'augmentation': self._augmentation,
+            'metrics': self.metrics,
+            'local_source': self._local_source,
+            'local_link_mode': self._local_link_mode,
+            'image_cache': self._image_cache,
+            'extra_resolutions': self._extra_resolutions,
+            'cache_revalidate': self._cache_revalidate,
         }
 
-        json_parser = JSONParser(logger, **config)
+    def _extract_labels_from_json(self, logger):
+        json_parser = JSONParser(logger, **self._parser_config())
+        self._tfrecord_digests = json_parser.tfrecord_digests
+
+    def _manifest_outputs(self, source_dir, file_ext):
+        """ List outputs of the current dataset located in source_dir, with their digest. """
+        source_dir = os.path.normpath(source_dir)
+        return {
+            path: digest for path, digest in self._manifest.output_digests().items()
+            if os.path.normpath(os.path.dirname(path)) == source_dir and path.endswith(file_ext)
+        }
+
+    def _sync_files(self, source_digests, dest_dir):
+        """ Sync new or changed files into dest_dir and remove the ones that disappeared. """
+        stats = self._directory_sync.sync(source_digests, dest_dir, self._manifest.synced_digests(dest_dir))
+        for outcome, count in stats.items():
+            self.metrics.increment('synced_' + outcome, count)
+
+    def _write_report(self):
+        """ Write per stage timings and counters of this run as json. """
+        self.metrics.write(self._report_file)
+        self._logger.info('Run report written to %s', self._report_file)
+
+    def _copy_to_deep_detection(self):
+        with self.metrics.stage('copy_to_detection'):
+            self._copy_annotation_to_deep_detection()
+            self._copy_resized_images_to_deep_detection()
+            self._copy_tfrecords_to_deep_detection()
 
     def _copy_annotation_to_deep_detection(self):
         """ Copy annotation xml and trainval files and labelmap.pbtxt to deep_detection."""
+        if not self._detection_dir:
+            return
+
         label_map_src = os.path.join(self._output_dir, 'label_map.pbtxt')
         label_map_dest = os.path.join(self._detection_annotation_dir, 'label_map.pbtxt')
 
         train_val_src = os.path.join(self._output_dir, 'trainval.txt')
         train_val_dest = os.path.join(self._detection_annotation_dir, 'trainval.txt')
 
-        annotations_files = glob(os.path.join(self._annotation_dir, 'pascal_voc', '*.xml'))
+        annotations_files = self._manifest_outputs(os.path.join(self._annotation_dir, 'pascal_voc'), '.xml')
 
         if os.path.exists(self._detection_dir):
             if os.path.exists(os.path.join(self._detection_dir, 'annotations')):
@@ -79,31 +187,33 @@ class Extractor:
                 annotation_dir_dest = os.path.join(self._detection_annotation_dir, 'xmls')
 
                 if os.path.exists(annotation_dir_dest):
-                    filelist = glob(os.path.join(os.path.join(annotation_dir_dest, '*')))
-                    for f in filelist:
-                        os.remove(f)
+                    self._sync_files(annotations_files, annotation_dir_dest)
 
-                    for annotation_file in annotations_files:
-                        file_name = os.path.basename(annotation_file)
-                        new_annotation_file = os.path.join(annotation_dir_dest, file_name)
-                        self._logger.info('Copying annotation file {} to {}'.format(
-                            annotation_file, new_annotation_file))
-                        shutil.copyfile(annotation_file, new_annotation_file)
+                if self._split_ratios:
+                    splits_src = os.path.join(self._output_dir, SPLITS_DIR_NAME)
+                    splits_dest = os.path.join(self._detection_annotation_dir, SPLITS_DIR_NAME)
+                    if os.path.exists(splits_dest):
+                        shutil.rmtree(splits_dest)
+                    shutil.copytree(splits_src, splits_dest)
 
     def _copy_resized_images_to_deep_detection(self):
         """ Copy resized images to deep_detection. """
-        resized_image_files = glob(os.path.join(self._resized_dir, '*.jpg'))
+        resized_image_files = self._manifest_outputs(self._resized_dir, '.jpg')
+
+        if not self._detection_dir:
+            return
 
         resized_image_files_dest = os.path.join(self._detection_dir, 'images')
 
         if os.path.exists(resized_image_files_dest):
-            filelist = glob(os.path.join(os.path.join(resized_image_files_dest, '*')))
-            for f in filelist:
-                os.remove(f)
-
-            for reized_image in resized_image_files:
-                file_name = os.path.basename(reized_image)
-                new_resized_image = os.path.join(self._detection_dir, 'images', file_name)
-                self._logger.info('Copying image file {} to {}'.format(
-                    reized_image, new_resized_image))
-                shutil.copyfile(reized_image, new_resized_image)
+            self._sync_files(resized_image_files, resized_image_files_dest)
+
+    def _copy_tfrecords_to_deep_detection(self):
+        """ Copy TFRecord shards and their index to deep_detection. """
+        if not self._tfrecord or not self._detection_dir:
+            return
+
+        tfrecord_dest = os.path.join(self._detection_dir, 'tfrecord')
+
+        if os.path.exists(tfrecord_dest):
+            self._sync_files(self._tfrecord_digests, tfrecord_dest)
@@ -1,9 +1,12 @@
 import argparse
 import json
+import logging
 import os
 
-from extractor.extractor import Extractor
-from utils.logger import create_logger
+from extractor.core.data.augment import DEFAULT_OPERATIONS, OPERATIONS
+from extractor.core.data.local_source import LocalSource
+from utils.logger import create_logger, setup_logging
+from utils.sync import DirectorySync
 
 
 class Main():
@@ -22,7 +25,7 @@ class Main():
                                  dest='json_file_dir',
                                  type=str,
                                  required=True,
-                                 help='Path to json file containing label data')
+                                 help='Path to json or json lines file containing label data')
 
         args_parser.add_argument('-o', '--output_dir',
                                  default=None,
@@ -52,18 +55,242 @@ class Main():
                                  required=False,
                                  help='Model required image height')
 
+        args_parser.add_argument('-rs', '--resolutions',
+                                 default=None,
+                                 dest='resolutions',
+                                 type=self._parse_resolution,
+                                 nargs='+',
+                                 required=False,
+                                 help='Target sizes as WIDTHxHEIGHT, the first one replaces -iw/-ih and the '
+                                      'others are written to their own folder in the same pass')
+
+        args_parser.add_argument('-dw', '--download_workers',
+                                 default=8,
+                                 dest='download_workers',
+                                 type=int,
+                                 required=False,
+                                 help='Number of images downloaded concurrently')
+
+        args_parser.add_argument('-w', '--workers',
+                                 default=1,
+                                 dest='workers',
+                                 type=int,
+                                 required=False,
+                                 help='Number of processes used to resize and annotate images')
+
+        args_parser.add_argument('-r', '--render',
+                                 default=False,
+                                 dest='render',
+                                 action='store_true',
+                                 required=False,
+                                 help='Render bounding boxes over resized images for debugging')
+
+        args_parser.add_argument('-t', '--tfrecord',
+                                 default=False,
+                                 dest='tfrecord',
+                                 action='store_true',
+                                 required=False,
+                                 help='Also write the dataset as sharded TFRecord files')
+
+        args_parser.add_argument('-ts', '--tfrecord_shard_size',
+                                 default=1000,
+                                 dest='tfrecord_shard_size',
+                                 type=int,
+                                 required=False,
+                                 help='Number of images per TFRecord shard')
+
+        args_parser.add_argument('-sp', '--split',
+                                 default=None,
+                                 dest='split',
+                                 type=float,
+                                 nargs=3,
+                                 metavar=('TRAIN', 'VAL', 'TEST'),
+                                 required=False,
+                                 help='Also write label stratified train/val/test lists with these shares')
+
+        args_parser.add_argument('-k', '--shards',
+                                 default=1,
+                                 dest='shards',
+                                 type=int,
+                                 required=False,
+                                 help='Number of label balanced shards the train list is cut in')
+
+        args_parser.add_argument('-ss', '--split_seed',
+                                 default=0,
+                                 dest='split_seed',
+                                 type=int,
+                                 required=False,
+                                 help='Seed breaking ties when splitting and sharding')
+
+        args_parser.add_argument('-au', '--augment',
+                                 default=0,
+                                 dest='augment_variants',
+                                 type=int,
+                                 required=False,
+                                 help='Number of augmented variants written next to each resized image')
+
+        args_parser.add_argument('-ao', '--augment_operations',
+                                 default=list(DEFAULT_OPERATIONS),
+                                 dest='augment_operations',
+                                 choices=OPERATIONS,
+                                 nargs='+',
+                                 required=False,
+                                 help='Augmentations randomly combined in every variant')
+
+        args_parser.add_argument('-as', '--augment_seed',
+                                 default=0,
+                                 dest='augment_seed',
+                                 type=int,
+                                 required=False,
+                                 help='Seed of the augmentations, variants are the same on every run with the same seed')
+
+        args_parser.add_argument('-sm', '--sync_mode',
+                                 default='auto',
+                                 dest='sync_mode',
+                                 choices=DirectorySync.MODES,
+                                 required=False,
+                                 help='How files are transferred to deep_detection')
+
+        args_parser.add_argument('-sc', '--sync_compare',
+                                 default='digest',
+                                 dest='sync_compare',
+                                 choices=DirectorySync.COMPARES,
+                                 required=False,
+                                 help='How files are detected as changed since last transfer to deep_detection')
+
+        args_parser.add_argument('-sw', '--sync_workers',
+                                 default=4,
+                                 dest='sync_workers',
+                                 type=int,
+                                 required=False,
+                                 help='Number of files transferred to deep_detection concurrently')
+
+        args_parser.add_argument('-ls', '--local_source',
+                                 default=[],
+                                 dest='local_sources',
+                                 action='append',
+                                 required=False,
+                                 help='PREFIX=ROOT, read images whose url starts with PREFIX from ROOT instead of '
+                                      'downloading them, may be repeated')
+
+        args_parser.add_argument('-lm', '--local_link_mode',
+                                 default='symlink',
+                                 dest='local_link_mode',
+                                 choices=LocalSource.LINK_MODES,
+                                 required=False,
+                                 help='How local source images appear in the images folder')
+
+        args_parser.add_argument('-c', '--cache_dir',
+                                 default=None,
+                                 dest='cache_dir',
+                                 type=str,
+                                 required=False,
+                                 help='Image cache directory shared between runs, output directories and processes')
+
+        args_parser.add_argument('-cs', '--cache_size',
+                                 default=10240,
+                                 dest='cache_size',
+                                 type=int,
+                                 required=False,
+                                 help='Image cache size limit in MB, least recently used images are evicted beyond it')
+
+        args_parser.add_argument('-cr', '--cache_revalidate',
+                                 default=False,
+                                 dest='cache_revalidate',
+                                 action='store_true',
+                                 required=False,
+                                 help='Check cached images against their ETag before using them')
+
+        args_parser.add_argument('-a', '--async',
+                                 default=False,
+                                 dest='use_async',
+                                 action='store_true',
+                                 required=False,
+                                 help='Overlap downloads, image processing and writes on an asyncio engine')
+
+        args_parser.add_argument('-q', '--quiet',
+                                 default=False,
+                                 dest='quiet',
+                                 action='store_true',
+                                 required=False,
+                                 help='Only log warnings and errors')
+
+        args_parser.add_argument('-v', '--verbose',
+                                 default=False,
+                                 dest='verbose',
+                                 action='store_true',
+                                 required=False,
+                                 help='Log every processed file')
+
+        args_parser.add_argument('-rf', '--report_file',
+                                 default=None,
+                                 dest='report_file',
+                                 type=str,
+                                 required=False,
+                                 help='Path of the json run report, defaults to run_report.json in output directory')
+
         return args_parser.parse_args()
 
+    @staticmethod
+    def _parse_resolution(value):
+        try:
+            width, height = value.lower().split('x')
+            return int(width), int(height)
+        except ValueError:
+            raise argparse.ArgumentTypeError('{} is not a WIDTHxHEIGHT resolution'.format(value))
+
     def main(self):
         """ Application main method. """
         parsed_args = self.parse_args()
+        if parsed_args.quiet:
+            setup_logging(logging.WARNING)
+        elif parsed_args.verbose:
+            setup_logging(logging.DEBUG)
+        else:
+            setup_logging(logging.INFO)
+
+        config = {
+            'json_file': parsed_args.json_file_dir,
+            'output_dir': parsed_args.output_dir,
+            'detection_dir': parsed_args.detection_dir,
+            'required_img_width': parsed_args.required_img_width,
+            'required_img_height': parsed_args.required_img_height,
+            'download_workers': parsed_args.download_workers,
+            'workers': parsed_args.workers,
+            'render': parsed_args.render,
+            'tfrecord': parsed_args.tfrecord,
+            'tfrecord_shard_size': parsed_args.tfrecord_shard_size,
+            'split_ratios': parsed_args.split,
+            'split_shards': parsed_args.shards,
+            'split_seed': parsed_args.split_seed,
+            'augment_variants': parsed_args.augment_variants,
+            'augment_operations': parsed_args.augment_operations,
+            'augment_seed': parsed_args.augment_seed,
+            'sync_mode': parsed_args.sync_mode,
+            'sync_compare': parsed_args.sync_compare,
+            'sync_workers': parsed_args.sync_workers,
+            'report_file': parsed_args.report_file,
+            'local_source': LocalSource.parse(parsed_args.local_sources),
+            'local_link_mode': parsed_args.local_link_mode,
+            'cache_dir': parsed_args.cache_dir,
+            'cache_size': parsed_args.cache_size << 20,
+            'cache_revalidate': parsed_args.cache_revalidate,
+        }
+
+        if parsed_args.resolutions:
+            config['required_img_width'], config['required_img_height'] = parsed_args.resolutions[0]
+            config['extra_target_sizes'] = parsed_args.resolutions[1:]
+
+        # the pipeline is imported once arguments are valid, --help and usage errors stay instant
+        if parsed_args.use_async:
+            import asyncio
+            from extractor.engine import ExtractionEngine
+
+            asyncio.run(ExtractionEngine(logger=create_logger, **config).run())
+        else:
+            from extractor.extractor import Extractor
 
-        extractor = Extractor(logger=create_logger,
-                              json_file=parsed_args.json_file_dir,
-                              output_dir=parsed_args.output_dir,
-                              detection_dir=parsed_args.detection_dir,
-                              required_img_width=parsed_args.required_img_width,
-                              required_img_height=parsed_args.required_img_height,)
+            Extractor(logger=create_logger, **config)
 
 
 if __name__ == '__main__':
@@ -1,20 +1,34 @@
 import argparse
-import glob
 import csv
 import os
 
-from glob import glob
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
 class GoogleCloudStorageLinkGenerator:
-    """ A basic utility class to generate links to google cloud storage imported files """
-    
+    """ A basic utility class to generate links to google cloud storage imported files
+
+    Every subdir of image_dir is walked on its own thread and gets its own csv,
+    rows being written as files are found. Relative paths of published files are
+    appended to a per subdir index in output_dir, so a rerun only emits images
+    added since the previous one.
+    """
+
     BASE_NAME = 'https://storage.googleapis.com/robosub-2018/dataset/dice/'
+    EXTENSIONS = ('.jpg', '.jpeg', '.png')
+    INDEX_DIR_NAME = '.published'
 
-    def __init__(self, image_dir, output_dir, output_name):
+    def __init__(self, image_dir, output_dir, output_name, base_name=BASE_NAME, extensions=EXTENSIONS,
+                 workers=8, incremental=True):
         self.image_dir = image_dir
         self.output_dir = output_dir
         self.output_name = output_name
+        self.base_name = base_name
+        self.extensions = tuple(extension.lower() for extension in extensions)
+        self.workers = workers
+        self.incremental = incremental
+        self.index_dir = os.path.join(self.output_dir, self.INDEX_DIR_NAME)
+        self.timestamp = datetime.now().strftime('%Y%m%d-%H%M%S')
         self.execute()
 
 
@@ -22,32 +36,64 @@ class GoogleCloudStorageLinkGenerator:
         """ Check if output dir exist or not and if not create it. """
         if not os.path.exists(self.output_dir):
             os.makedirs(self.output_dir)
+        os.makedirs(self.index_dir, exist_ok=True)
+
+    def walk_images(self, directory):
+        """ Yield paths of images below directory, relative to image_dir, using scandir. """
+        pending = [directory]
+        while pending:
+            with os.scandir(pending.pop()) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        pending.append(entry.path)
+                    elif entry.name.lower().endswith(self.extensions) and entry.is_file():
+                        yield os.path.relpath(entry.path, self.image_dir).replace(os.sep, '/')
+
+    def load_index(self, sub_dir):
+        """ Relative paths already published from sub_dir. """
+        index_file = os.path.join(self.index_dir, sub_dir + '.txt')
+        if not self.incremental or not os.path.exists(index_file):
+            return set()
+        with open(index_file, 'r') as index:
+            return set(line.rstrip('\n') for line in index)
 
     def list_subdir_file_content_and_create_csv(self):
-        """ Make a list of all subdirs files and generate a list of link to google cloud storage. """
-        sub_dirs = glob(self.image_dir + '*/')
-
-        for sub_dir in sub_dirs:
-            urls = []
-            sub_dir_content = glob(sub_dir + '*')
-            for image_path in sub_dir_content:
-                splited = image_path.rsplit('/', 2)
-                
-                url = os.path.join(self.BASE_NAME, splited[1], splited[2])
-                urls.append(url)
-
-            base_name = os.path.basename(os.path.normpath(sub_dir))
-            self.create_csv(urls, base_name)
-
-    
-    def create_csv(self, urls, sub_dir):
-        """ Generate a csv file. """
-        file_name = 'link_to_gcc_{}_{}.csv'.format(sub_dir,datetime.now())
-        output_file = os.path.join(self.output_dir,  file_name)
-        with open(output_file, 'w') as csv_file:
+        """ Walk all subdirs in parallel and generate a csv of links to google cloud storage for each. """
+        sub_dirs = [entry.name for entry in os.scandir(self.image_dir) if entry.is_dir()]
+
+        with ThreadPoolExecutor(max_workers=max(1, self.workers)) as executor:
+            for sub_dir, count in zip(sub_dirs, executor.map(self.create_csv, sub_dirs)):
+                print('{}: {} new images'.format(sub_dir, count))
+
+    def create_csv(self, sub_dir):
+        """ Generate a csv file of the new images of sub_dir, return how many it holds. """
+        published = self.load_index(sub_dir)
+        file_name = '{}_{}_{}.csv'.format(self.output_name, sub_dir, self.timestamp)
+        output_file = os.path.join(self.output_dir, file_name)
+        index_file = os.path.join(self.index_dir, sub_dir + '.txt')
+
+        count = 0
+        with open(output_file + '.tmp', 'w') as csv_file, open(index_file + '.tmp', 'w') as new_index:
             csv_writer = csv.writer(csv_file, delimiter=',', quoting=csv.QUOTE_ALL)
-            for url in urls:
-                csv_writer.writerow([url])
+            for image_path in self.walk_images(os.path.join(self.image_dir, sub_dir)):
+                if image_path in published:
+                    continue
+                csv_writer.writerow([self.base_name + image_path])
+                new_index.write(image_path + '\n')
+                count += 1
+
+        if not count:
+            os.remove(output_file + '.tmp')
+            os.remove(index_file + '.tmp')
+            return 0
+
+        # the index only grows once its csv is complete, an interrupted run emits the same images again
+        os.replace(output_file + '.tmp', output_file)
+        with open(index_file + '.tmp', 'r') as new_index, open(index_file, 'a' if self.incremental else 'w') as index:
+            for line in new_index:
+                index.write(line)
+        os.remove(index_file + '.tmp')
+        return count
 
     def execute(self):
         """ Main method. """
@@ -59,7 +105,7 @@ class GoogleCloudStorageLinkGenerator:
 def parse_args():
         parser = argparse.ArgumentParser(description='Google cloud storage link csv generator.')
 
-        parser.add_argument('-i', '--image_dir', 
+        parser.add_argument('-i', '--image_dir',
                             dest='image_dir',
                             required=True,
                             type=str,
@@ -73,16 +119,39 @@ def parse_args():
                             dest='output_name',
                             required=True,
                             type=str,
-                            help='CSV output file name')
+                            help='CSV output file name prefix')
+        parser.add_argument('-b', '--base_name',
+                            dest='base_name',
+                            default=GoogleCloudStorageLinkGenerator.BASE_NAME,
+                            type=str,
+                            help='Bucket url image paths are appended to')
+        parser.add_argument('-e', '--extensions',
+                            dest='extensions',
+                            nargs='+',
+                            default=GoogleCloudStorageLinkGenerator.EXTENSIONS,
+                            help='Image file extensions to publish')
+        parser.add_argument('-w', '--workers',
+                            dest='workers',
+                            default=8,
+                            type=int,
+                            help='Number of subdirs walked concurrently')
+        parser.add_argument('-f', '--full',
+                            dest='incremental',
+                            action='store_false',
+                            help='Publish every image again and rebuild the index of published images')
 
         return parser.parse_args()
 
 
 if __name__ == '__main__':
-    
+
     parsed_args = parse_args()
 
-    link_generator = GoogleCloudStorageLinkGenerator(parsed_args.image_dir, 
-                                                     parsed_args.output_dir, 
-                                                     parsed_args.output_name)
+    link_generator = GoogleCloudStorageLinkGenerator(parsed_args.image_dir,
+                                                     parsed_args.output_dir,
+                                                     parsed_args.output_name,
+                                                     base_name=parsed_args.base_name,
+                                                     extensions=parsed_args.extensions,
+                                                     workers=parsed_args.workers,
+                                                     incremental=parsed_args.incremental)
 
@@ -1,8 +1,25 @@
 import argparse
+import hashlib
 import json
 import os
-
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
 from glob import glob
+from itertools import islice
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from extractor.core.parser.json_stream import iter_json_entries, iter_json_entries_from
+from utils.concurrency import imap_bounded
+
+DEDUP_KEYS = {'id': 'ID', 'url': 'Labeled Data'}
+POLICIES = ('latest', 'first', 'updated')
+FORMATS = ('json', 'jsonl')
+# entries serialized by one filter job, what a worker holds and sends back at once
+CHUNK_ENTRIES = 1024
 
 
 def parse_args():
@@ -25,12 +42,37 @@ def parse_args():
                              required=True,
                              help='Path to json file containing all labeling data from labelbox.io')
 
+    args_parser.add_argument('-d', '--dedup',
+                             default='id',
+                             dest='dedup',
+                             choices=sorted(DEDUP_KEYS) + ['none'],
+                             help='Entries sharing this key are merged into one')
+
+    args_parser.add_argument('-p', '--policy',
+                             default='latest',
+                             dest='policy',
+                             choices=POLICIES,
+                             help='Which duplicate is kept: the one from the most recently modified file, '
+                                  'the first one seen, or the one with the latest "Updated At"')
+
+    args_parser.add_argument('-f', '--format',
+                             default=None,
+                             dest='format',
+                             choices=FORMATS,
+                             help='Output format, defaults to json lines for .jsonl output files and json otherwise')
+
+    args_parser.add_argument('-w', '--workers',
+                             default=os.cpu_count() or 1,
+                             dest='workers',
+                             type=int,
+                             help='Number of files parsed concurrently')
+
     return args_parser.parse_args()
 
 
 def list_json_files(folder_path):
     """
-    Create a list of all .json file in a given file path
+    Create a list of all .json and .jsonl file in a given file path, oldest first
 
     Arguments:
         folder_path {str} - - [folder containing all json files to be extracted]
@@ -38,48 +80,175 @@ def list_json_files(folder_path):
     Returns:
         [list str] - - [list containing all file path to json files]
     """
-    query = os.path.join(folder_path, '*.json')
-    file_list = glob(query)
+    file_list = glob(os.path.join(folder_path, '*.json')) + glob(os.path.join(folder_path, '*.jsonl'))
 
-    return file_list
+    return sorted(file_list, key=lambda file_path: (os.path.getmtime(file_path), file_path))
 
 
-def extract_json_from_files(json_files):
+def key_hash(value):
+    """ 64 bit hash of a dedup key, the index stores these instead of the keys. """
+    return int.from_bytes(hashlib.blake2b(value.encode('utf-8'), digest_size=8).digest(), 'little', signed=True)
+
+
+def updated_at(entry):
+    """ Timestamp of the entry's last update, -inf when it has none. """
+    value = entry.get('Updated At') or entry.get('Created At')
+    if not value:
+        return float('-inf')
+    try:
+        return datetime.fromisoformat(value.replace('Z', '+00:00')).timestamp()
+    except (AttributeError, ValueError):
+        return float('-inf')
+
+
+def index_file(job):
+    """ Index of one file as compact arrays.
+
+    Returns the dedup key hash, whether the entry has the key and the update time
+    of every entry (all three None without dedup key), and the byte offset of
+    every CHUNK_ENTRIES-th entry, where filter jobs resume reading the file.
     """
-    Extract labelbox bounding box data from labelbox.io extract files.
+    file_path, dedup_key = job
+    hashes = []
+    keyed = []
+    times = []
+    offsets = []
+    with open(file_path, 'r', encoding='utf-8', newline='') as json_file:
+        for position, (offset, entry) in enumerate(iter_json_entries(json_file, offsets=True)):
+            if not position % CHUNK_ENTRIES:
+                offsets.append(offset)
+            if dedup_key is None:
+                continue
+            key = entry.get(dedup_key)
+            hashes.append(key_hash(str(key)) if key is not None else 0)
+            keyed.append(key is not None)
+            times.append(updated_at(entry))
+
+    if dedup_key is None:
+        return None, None, None, offsets
+    return (np.array(hashes, dtype=np.int64), np.array(keyed, dtype=bool), np.array(times, dtype=np.float64),
+            offsets)
+
+
+def select_entries(indexes, policy):
+    """ Boolean mask per file of the entries kept once duplicates are merged.
+
+    Every entry is ranked by (update time when policy is 'updated', file order,
+    position in file); the highest rank wins, or the lowest one with policy 'first'.
+    Entries without dedup key are never merged, they are all kept.
+    """
+    sizes = [len(hashes) for hashes, _, _, _ in indexes]
+    if not sum(sizes):
+        return [np.zeros(0, dtype=bool) for _ in indexes]
+
+    hashes = np.concatenate([hashes for hashes, _, _, _ in indexes])
+    # flat position already orders entries by file then by position in file
+    order = np.flatnonzero(np.concatenate([keyed for _, keyed, _, _ in indexes]))
+    sort_keys = [order]
+    if policy == 'updated':
+        sort_keys.append(np.concatenate([times for _, _, times, _ in indexes])[order])
+    sort_keys.append(hashes[order])
+
+    # sorted by hash, then rank within hash
+    ranked = order[np.lexsort(sort_keys)]
+    sorted_hashes = hashes[ranked]
+    winners = np.ones(len(ranked), dtype=bool)
+    if policy == 'first':
+        winners[1:] = sorted_hashes[1:] != sorted_hashes[:-1]
+    else:
+        winners[:-1] = sorted_hashes[:-1] != sorted_hashes[1:]
+
+    keep = np.ones(len(hashes), dtype=bool)
+    keep[ranked] = winners
+    return np.split(keep, np.cumsum(sizes)[:-1])
+
+
+def filter_jobs(json_files, indexes, masks):
+    """ One job per CHUNK_ENTRIES entries of every file, in file order. """
+    for file_path, (_, _, _, offsets), keep in zip(json_files, indexes, masks):
+        for chunk, offset in enumerate(offsets):
+            start = chunk * CHUNK_ENTRIES
+            yield file_path, offset, CHUNK_ENTRIES, None if keep is None else keep[start:start + CHUNK_ENTRIES]
+
+
+def filter_chunk(job):
+    """ Serialized entries of one chunk of a file selected by its mask, all of them when mask is None. """
+    file_path, offset, count, keep = job
+    with open(file_path, 'rb') as json_file:
+        entries = islice(iter_json_entries_from(json_file, offset), count)
+        if keep is None:
+            return [json.dumps(entry) for entry in entries]
+        return [json.dumps(entry) for entry, kept in zip(entries, keep) if kept]
+
+
+def extract_json_from_files(json_files, dedup='id', policy='latest', workers=1):
+    """
+    Stream serialized labelbox bounding box data from labelbox.io extract files, duplicates merged.
+
+    Files are read twice, in parallel: a first pass indexes the dedup key hash of
+    every entry along with chunk offsets, a second one streams the selected
+    entries in file order, chunk by chunk. Only the index and a few chunks of
+    CHUNK_ENTRIES entries at a time are held in memory, however large the files.
 
     Arguments:
-        json_files {[list(str)]} - - [list of string containg all json files path]
+        json_files {[list(str)]} - - [list of string containg all json files path, oldest first]
 
     Returns:
-        [list(str)] - - [list containing all extracted json data]
+        [generator(str)] - - [serialized json entries]
     """
-    json_data = []
-    for file_ in json_files:
-        with open(file_, 'r') as json_file:
-            data = json.load(json_file)
-            json_data.extend(data)
+    with ProcessPoolExecutor(max_workers=max(1, workers)) as executor:
+        dedup_key = DEDUP_KEYS.get(dedup)
+        indexes = list(executor.map(index_file, [(file_, dedup_key) for file_ in json_files]))
+        masks = [None] * len(json_files) if dedup_key is None else select_entries(indexes, policy)
 
-    return json_data
+        jobs = filter_jobs(json_files, indexes, masks)
+        for entries in imap_bounded(executor, filter_chunk, jobs, window=max(1, workers)):
+            yield from entries
 
 
-def export_to_json_file(output_file, json_data):
+def export_to_json_file(output_file, json_data, output_format='json'):
     """
-    Export collected data from labelbox.io extraction files to a new json file.
+    Export collected data from labelbox.io extraction files to a new json or json lines file.
 
     Arguments:
         output_file {str]} -- [output json file path]
-        json_data {[list(str)]} -- [json data to be extracted to file]
+        json_data {[iterable(str)]} -- [serialized json entries to be written to file]
+
+    Returns:
+        [int] -- [number of entries written]
     """
-    with open(output_file, 'w+') as json_file:
-        json.dump(json_data, json_file)
+    count = 0
+    tmp_file = output_file + '.tmp'
+    with open(tmp_file, 'w') as json_file:
+        if output_format == 'jsonl':
+            for entry in json_data:
+                json_file.write(entry)
+                json_file.write('\n')
+                count += 1
+        else:
+            json_file.write('[')
+            for entry in json_data:
+                if count:
+                    json_file.write(', ')
+                json_file.write(entry)
+                count += 1
+            json_file.write(']')
+    os.replace(tmp_file, output_file)
+
+    return count
 
 
 def main():
     parsed_args = parse_args()
-    json_files = list_json_files(parsed_args.json_files_folder)
-    json_data = extract_json_from_files(json_files)
-    export_to_json_file(parsed_args.output_json_file, json_data)
+    output_format = parsed_args.format or ('jsonl' if parsed_args.output_json_file.endswith('.jsonl') else 'json')
+    output_file = os.path.abspath(parsed_args.output_json_file)
+    json_files = [file_ for file_ in list_json_files(parsed_args.json_files_folder)
+                  if os.path.abspath(file_) != output_file]
+
+    json_data = extract_json_from_files(
+        json_files, dedup=parsed_args.dedup, policy=parsed_args.policy, workers=parsed_args.workers)
+    count = export_to_json_file(parsed_args.output_json_file, json_data, output_format)
+    print('Merged {} files into {} entries at {}'.format(len(json_files), count, parsed_args.output_json_file))
 
 
 if __name__ == '__main__':
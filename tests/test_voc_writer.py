@@ -0,0 +1,67 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from extractor.core.data.generator.voc_writer import PascalVOCWriter
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'pascal_voc')
+IMAGE_PATH = '/data/deep_extraction/resized/img_0000.jpg'
+
+# objects of each golden file, written by the pascal_voc_writer.Writer the pipeline used to depend on
+FIXTURE_OBJECTS = {
+    'objects.xml': [
+        ('Buoy', [75, 126, 75, 256, 300, 256, 300, 126], {}),
+        ('Gate', [10, 20, 30, 40, 55, 60, 10, 290, 5, 100, 2, 50], {}),
+        ('Dice', [0, 0, 299, 0, 299, 299, 0, 299], {'pose': 'Left', 'truncated': 1, 'difficult': 1}),
+    ],
+    'empty.xml': [],
+}
+
+
+class PascalVOCWriterTest(unittest.TestCase):
+    """ The native writer must keep producing the bytes of the Jinja based pascal_voc_writer. """
+
+    def setUp(self):
+        self.output_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.output_dir)
+
+    @staticmethod
+    def create_writer(objects):
+        writer = PascalVOCWriter(path=IMAGE_PATH, width=300, height=300, database='Unknown')
+        for name, xy_coords, options in objects:
+            writer.addObject(name=name, xy_coords=xy_coords, **options)
+        return writer
+
+    @staticmethod
+    def read_fixture(file_name):
+        with open(os.path.join(FIXTURES_DIR, file_name), 'rb') as fixture_file:
+            return fixture_file.read()
+
+    def test_render_matches_golden_files(self):
+        for file_name, objects in FIXTURE_OBJECTS.items():
+            with self.subTest(fixture=file_name):
+                rendered = self.create_writer(objects).render().encode('utf-8')
+                self.assertEqual(rendered, self.read_fixture(file_name))
+
+    def test_save_writes_and_returns_golden_bytes(self):
+        for file_name, objects in FIXTURE_OBJECTS.items():
+            with self.subTest(fixture=file_name):
+                annotation_path = os.path.join(self.output_dir, file_name)
+                content = self.create_writer(objects).save(annotation_path)
+
+                with open(annotation_path, 'rb') as annotation_file:
+                    self.assertEqual(annotation_file.read(), self.read_fixture(file_name))
+                self.assertEqual(content, self.read_fixture(file_name))
+
+        # written through a temporary file renamed into place, nothing else is left behind
+        self.assertEqual(sorted(os.listdir(self.output_dir)), sorted(FIXTURE_OBJECTS))
+
+
+if __name__ == '__main__':
+    unittest.main()
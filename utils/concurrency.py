@@ -0,0 +1,31 @@
+from collections import deque
+from concurrent.futures import Future
+
+
+def completed_future(result):
+    """ Wrap an already known result so it can be queued alongside submitted calls. """
+    future = Future()
+    future.set_result(result)
+    return future
+
+
+def imap_bounded(executor, function, iterable, window):
+    """ Map function over iterable with executor, keeping at most window calls in flight.
+
+    Results are yielded in input order as soon as they (and every call before them)
+    complete, so a slow producer or a huge iterable never gets fully materialized.
+    Futures found in iterable are queued as they are instead of being submitted.
+    """
+    pending = deque()
+
+    for item in iterable:
+        if isinstance(item, Future):
+            pending.append(item)
+        else:
+            pending.append(executor.submit(function, item))
+
+        if len(pending) >= window:
+            yield pending.popleft().result()
+
+    while pending:
+        yield pending.popleft().result()
@@ -1,13 +1,98 @@
+import atexit
 import logging
+import logging.handlers
+import multiprocessing
+import os
+import queue
 import sys
+import time
+
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(name)s - %(message)s'
+
+_configured_pid = None
+_listener = None
+
+
+def setup_logging(log_level=logging.INFO, stream=sys.stderr):
+    """ Configure root logging once per process.
+
+    In the main process records are handed through a queue to a background
+    thread doing the formatting and the writes, so logging calls never block
+    on the stream. Worker processes write directly, a background thread would
+    be killed with its pending records when the pool shuts the worker down.
+    """
+    global _configured_pid, _listener
+
+    # a forked child inherits the listener object but not its thread
+    if _listener is not None and _configured_pid == os.getpid():
+        _listener.stop()
+    _listener = None
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.setLevel(log_level)
+
+    stream_handler = logging.StreamHandler(stream)
+    stream_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+
+    if multiprocessing.current_process().name == 'MainProcess':
+        records = queue.SimpleQueue()
+        root.addHandler(logging.handlers.QueueHandler(records))
+        _listener = logging.handlers.QueueListener(records, stream_handler, respect_handler_level=True)
+        _listener.start()
+    else:
+        root.addHandler(stream_handler)
+
+    _configured_pid = os.getpid()
+
+
+@atexit.register
+def shutdown_logging():
+    """ Write pending records and stop the background logging thread. """
+    global _listener
+
+    if _listener is not None and _configured_pid == os.getpid():
+        _listener.stop()
+        _listener = None
+
 
 def create_logger(module_name, log_level=logging.INFO):
     """ Configure base logger for each of our classes. """
-    
-    logging.basicConfig(
-        format='%(asctime)s - %(levelname)s - %(name)s - %(message)s',
-        level=log_level,
-        stream=sys.stderr)
-    logger = logging.getLogger(module_name)
-
-    return logger
\ No newline at end of file
+    if _configured_pid != os.getpid():
+        # a forked worker keeps the level configured by its parent
+        setup_logging(log_level if _configured_pid is None else logging.getLogger().level)
+
+    return logging.getLogger(module_name)
+
+
+class ProgressLogger:
+    """ Log a periodic summary of processed items instead of a line per item. """
+
+    def __init__(self, logger, total=None, interval=5., unit='images'):
+        self._logger = logger
+        self._total = total
+        self._interval = interval
+        self._unit = unit
+        self._enabled = logger.isEnabledFor(logging.INFO)
+        self._start = time.monotonic()
+        self._next_report = self._start + interval
+        self.count = 0
+
+    def update(self, count=1):
+        self.count += count
+        if self._enabled and time.monotonic() >= self._next_report:
+            self._next_report += self._interval
+            self._report()
+
+    def _report(self):
+        elapsed = time.monotonic() - self._start
+        rate = self.count / elapsed if elapsed else 0.
+        if self._total:
+            self._logger.info('Processed %d/%d %s (%.1f/s).', self.count, self._total, self._unit, rate)
+        else:
+            self._logger.info('Processed %d %s (%.1f/s).', self.count, self._unit, rate)
+
+    def finish(self):
+        if self._enabled:
+            self._report()
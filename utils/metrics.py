@@ -0,0 +1,119 @@
+import json
+import math
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime
+
+# latency histogram buckets grow by 5%, percentiles are exact within that resolution
+BUCKET_GROWTH = 1.05
+BUCKET_ORIGIN = 1e-6
+
+
+@contextmanager
+def timed(timings, stage):
+    """ Add time spent in the block to timings[stage], for code that cannot reach a RunMetrics. """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[stage] = timings.get(stage, 0.) + time.perf_counter() - start
+
+
+class StageMetrics:
+    """ Duration, latency histogram and byte count of every call to one pipeline stage. """
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.
+        self.bytes = 0
+        self._buckets = defaultdict(int)
+
+    def add(self, duration, size=0):
+        self.count += 1
+        self.total += duration
+        self.bytes += size
+        bucket = int(math.log(max(duration, BUCKET_ORIGIN) / BUCKET_ORIGIN, BUCKET_GROWTH))
+        self._buckets[bucket] += 1
+
+    def percentile(self, percent):
+        """ Upper bound of the bucket holding the given percentile, in seconds. """
+        if not self.count:
+            return 0.
+
+        rank = math.ceil(self.count * percent / 100.)
+        seen = 0
+        for bucket in sorted(self._buckets):
+            seen += self._buckets[bucket]
+            if seen >= rank:
+                break
+        return BUCKET_ORIGIN * BUCKET_GROWTH ** (bucket + 1)
+
+    def report(self):
+        return {
+            'count': self.count,
+            'total_s': round(self.total, 6),
+            'per_s': round(self.count / self.total, 3) if self.total else None,
+            'p50_ms': round(self.percentile(50) * 1000, 3),
+            'p95_ms': round(self.percentile(95) * 1000, 3),
+            'bytes': self.bytes,
+        }
+
+
+class StageCall:
+    """ Handle yielded by RunMetrics.stage, size may be set once known inside the block. """
+
+    def __init__(self, size=0):
+        self.size = size
+
+
+class RunMetrics:
+    """ Thread safe per stage timings and counters of an extraction run, reported as json. """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stages = defaultdict(StageMetrics)
+        self._counters = defaultdict(int)
+        self._started_at = datetime.now()
+        self._start = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name, size=0):
+        """ Time the block as one call to stage name. """
+        call = StageCall(size)
+        start = time.perf_counter()
+        try:
+            yield call
+        finally:
+            self.add(name, time.perf_counter() - start, call.size)
+
+    def add(self, name, duration, size=0):
+        with self._lock:
+            self._stages[name].add(duration, size)
+
+    def add_timings(self, timings):
+        """ Record {stage: seconds} measured elsewhere, e.g. in a worker process. """
+        with self._lock:
+            for name, duration in timings.items():
+                self._stages[name].add(duration)
+
+    def increment(self, counter, value=1):
+        with self._lock:
+            self._counters[counter] += value
+
+    def report(self):
+        duration = time.perf_counter() - self._start
+        images = self._counters.get('images', 0)
+        with self._lock:
+            return {
+                'started_at': self._started_at.isoformat(),
+                'duration_s': round(duration, 3),
+                'images_per_s': round(images / duration, 3) if duration else None,
+                'counters': dict(self._counters),
+                'stages': {name: stage.report() for name, stage in sorted(self._stages.items())},
+            }
+
+    def write(self, file_path):
+        with open(file_path, 'w') as report_file:
+            json.dump(self.report(), report_file, indent=2, sort_keys=True)
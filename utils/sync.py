@@ -0,0 +1,163 @@
+import errno
+import fcntl
+import hashlib
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+
+# linux ioctl cloning a file extent by extent (btrfs, xfs, ...)
+FICLONE = 0x40049409
+
+
+def file_digest(file_path):
+    hasher = hashlib.sha1()
+    with open(file_path, 'rb') as file_:
+        for chunk in iter(lambda: file_.read(1 << 20), b''):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def write_atomic(file_path, content):
+    """ Replace file_path with content through a temporary file renamed into place.
+
+    Outputs may be hardlinked into a synced folder: renaming breaks the link, so
+    the synced copy keeps its previous content until the next sync instead of
+    being truncated and rewritten in place.
+    """
+    tmp_path = '{}.{}.tmp'.format(file_path, os.getpid())
+    try:
+        with open(tmp_path, 'wb') as tmp_file:
+            tmp_file.write(content)
+        os.replace(tmp_path, file_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def reflink(source_file, dest_file):
+    """ Copy on write clone of source_file, raise OSError when the filesystem does not support it. """
+    with open(source_file, 'rb') as source, open(dest_file, 'wb') as dest:
+        try:
+            fcntl.ioctl(dest.fileno(), FICLONE, source.fileno())
+        except OSError:
+            dest.close()
+            os.remove(dest_file)
+            raise
+
+
+class DirectorySync:
+    """ Mirror a set of source files into a flat destination folder.
+
+    Transfer modes:
+        copy     -- plain copy, preserving mtime.
+        hardlink -- link to the source file, copy when across filesystems.
+        reflink  -- copy on write clone, copy when unsupported.
+        auto     -- reflink, then hardlink, then copy, whichever works first.
+
+    Files are compared with:
+        digest -- source digest against the digest recorded when last synced, no I/O.
+        mtime  -- size and modification time of source and destination.
+        hash   -- source digest against the hash of the destination content.
+
+    Only changed files are transferred, over workers threads, and destination
+    files without a source are removed.
+    """
+
+    MODES = ('auto', 'copy', 'hardlink', 'reflink')
+    COMPARES = ('digest', 'mtime', 'hash')
+
+    def __init__(self, logger, mode='auto', compare='digest', workers=4):
+        if mode not in self.MODES:
+            raise ValueError('Unknown sync mode {}, expected one of {}'.format(mode, self.MODES))
+        if compare not in self.COMPARES:
+            raise ValueError('Unknown sync comparison {}, expected one of {}'.format(compare, self.COMPARES))
+
+        self._logger = logger(__name__)
+        self._mode = mode
+        self._compare = compare
+        self._workers = max(1, workers)
+
+    def __str__(self):
+        return 'A directory sync using {} transfers and {} comparison'.format(self._mode, self._compare)
+
+    def _is_unchanged(self, source_file, digest, dest_file, synced_digest):
+        if not os.path.exists(dest_file):
+            return False
+
+        if self._compare == 'digest':
+            return synced_digest is not None and synced_digest == digest
+
+        if self._compare == 'mtime':
+            source_stat = os.stat(source_file)
+            dest_stat = os.stat(dest_file)
+            return (source_stat.st_size == dest_stat.st_size
+                    and int(source_stat.st_mtime) == int(dest_stat.st_mtime))
+
+        return file_digest(dest_file) == digest
+
+    def _transfer(self, source_file, dest_file):
+        """ Replace dest_file by source_file content and return the transfer mode used. """
+        tmp_file = dest_file + '.sync'
+        modes = ('reflink', 'hardlink', 'copy') if self._mode == 'auto' else (self._mode, 'copy')
+
+        for mode in modes:
+            try:
+                if os.path.lexists(tmp_file):
+                    os.remove(tmp_file)
+
+                if mode == 'reflink':
+                    reflink(source_file, tmp_file)
+                    shutil.copystat(source_file, tmp_file)
+                elif mode == 'hardlink':
+                    os.link(source_file, tmp_file)
+                else:
+                    shutil.copy2(source_file, tmp_file)
+
+                os.replace(tmp_file, dest_file)
+                return mode
+            except OSError as e:
+                if mode == 'copy' or e.errno not in (
+                        errno.EXDEV, errno.EOPNOTSUPP, errno.ENOTTY, errno.EINVAL, errno.EPERM, errno.EMLINK):
+                    raise
+
+    def sync(self, source_digests, dest_dir, synced_digests=None):
+        """ Sync {source path: digest} into dest_dir and return the count of files per outcome.
+
+        synced_digests maps destination file names to the digest they were synced
+        with; it is read by the digest comparison and updated in place.
+        """
+        synced_digests = synced_digests if synced_digests is not None else {}
+        stats = {'unchanged': 0, 'removed': 0, 'copy': 0, 'hardlink': 0, 'reflink': 0}
+        transfers = []
+        file_names = set()
+
+        for source_file, digest in sorted(source_digests.items()):
+            file_name = os.path.basename(source_file)
+            file_names.add(file_name)
+            dest_file = os.path.join(dest_dir, file_name)
+
+            if self._compare == 'hash' and digest is None:
+                digest = file_digest(source_file)
+
+            if self._is_unchanged(source_file, digest, dest_file, synced_digests.get(file_name)):
+                stats['unchanged'] += 1
+            else:
+                transfers.append((file_name, source_file, dest_file, digest))
+
+        with ThreadPoolExecutor(max_workers=self._workers) as executor:
+            modes = executor.map(lambda transfer: self._transfer(*transfer[1:3]), transfers)
+            for (file_name, _, _, digest), mode in zip(transfers, modes):
+                synced_digests[file_name] = digest
+                stats[mode] += 1
+
+        for file_name in os.listdir(dest_dir):
+            if file_name not in file_names:
+                os.remove(os.path.join(dest_dir, file_name))
+                synced_digests.pop(file_name, None)
+                stats['removed'] += 1
+
+        self._logger.info(
+            'Synced %s: %d copied, %d hardlinked, %d reflinked, %d removed, %d unchanged.',
+            dest_dir, stats['copy'], stats['hardlink'], stats['reflink'], stats['removed'], stats['unchanged'])
+        return stats